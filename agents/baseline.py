@@ -1,4 +1,4 @@
-from utils import bfs_search, get_valid_moves
+from utils import MOVES, get_distance_oracle, get_valid_moves
 import numpy as np
 import random
 
@@ -8,28 +8,14 @@ class BaseCat():
         # Posición inicial del agente
         self.pos = position
 
-        # Hash utilizado para calcular que movimiento seguir tras hacer una búsqueda mediante BFS
-        self.diffs = {
-            np.array([0, -1]).tobytes(): 0,
-            np.array([0, 1]).tobytes(): 1,
-            np.array([-1, 0]).tobytes(): 2,
-            np.array([1, 0]).tobytes(): 3,
-            np.array([0, 0]).tobytes(): 4
-        }
-
     def get_action(self, lab_map, cat_pos, mouse_pos, noise = 0, train = False):
 
         # Considerar los movimientos como ruidosos, con una probabilidad de hacer uno aleatorio
         if random.random() < noise:
             return random.randint(0, 4)
 
-        # Ruta más corta de la posición actual del gato a la posición del ratón
-        route = bfs_search(lab_map, cat_pos, mouse_pos)
-
-        # Consideramos el siguiente paso en la ruta más corta como el movimiento a seguir
-        optimal_position = route[1] if len(route) > 1 else route[0]
-        diff = np.array(optimal_position.coordinates) - cat_pos
-        move = self.diffs.get(diff.tobytes(), 4)
+        # Siguiente paso en la ruta más corta del gato al ratón, consultado en la tabla precalculada del mapa
+        move = int(get_distance_oracle(lab_map).next_move(cat_pos, mouse_pos))
 
         return move
     
@@ -47,15 +33,6 @@ class BaseMouse():
         # Posición inicial del agente
         self.pos = position
 
-        # Hash utilizado para calcular que efecto tiene una cierta posición
-        self.moves = {
-            0: np.array([0, -1]),
-            1: np.array([0, 1]),
-            2: np.array([-1, 0]),
-            3: np.array([1, 0]),
-            4: np.array([0, 0])
-        }
-
     def get_action(self, lab_map, cat_pos, mouse_pos, noise = 0, train = False):
 
         # Considerar los movimientos como ruidosos, con una probabilidad de hacer uno aleatorio
@@ -65,15 +42,12 @@ class BaseMouse():
 
         # Movimientos posibles desde la configuración actual
         valid_moves = np.array(get_valid_moves(lab_map, mouse_pos))
-        distances = []
 
         # Calculamos la distancia al gato desde cada posible nueva configuración
-        for move in valid_moves:
-            new_pos = mouse_pos + self.moves[move]
-            distances.append(np.sum(np.abs(new_pos - cat_pos)))
+        distances = np.sum(np.abs(mouse_pos + MOVES[valid_moves] - cat_pos), axis = 1)
         
         # Creamos un array con los movimientos que más nos alejan del gato
-        best_moves = valid_moves[np.array(distances) == max(distances)]
+        best_moves = valid_moves[distances == distances.max()]
         weights = [1 for _ in best_moves]
 
         # Excepciones, trataremos de evitar caminos sin salida, reduciendo su probabilidad
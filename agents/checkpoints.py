@@ -0,0 +1,177 @@
+import threading
+import atexit
+import queue
+import os
+
+import numpy as np
+
+from agents.qstore import SparseQTable
+
+def load_checkpoint(path):
+    """ Carga una Q-Table guardada por CheckpointManager (.npy, .npz completo, .delta.npz o .sparse.npz) """
+
+    if path.endswith(".npy"):
+        return np.load(path)
+
+    data = np.load(path)
+    if "table" in data:
+        return data["table"]
+    if "states" in data:
+        return SparseQTable.from_arrays(int(data["n_states"]), data["states"], data["values"])
+
+    # Una diferencia guarda solo las filas que cambiaron respecto a su snapshot completo base
+    table = load_checkpoint(os.path.join(os.path.dirname(path), str(data["base"])))
+    table[data["rows"]] = data["values"]
+    return table
+
+# Fracción de filas cambiadas sobre la que una diferencia se guarda como snapshot completo (cada fila de una
+# diferencia ocupa su índice además de sus valores, así una diferencia nunca pesa más de ~60% de uno completo)
+DELTA_MAX_FRACTION = 0.5
+
+class CheckpointManager:
+    """
+    Guarda snapshots de una Q-Table desde un hilo en segundo plano, sin detener el entrenamiento.
+    Con delta = True, entre snapshots completos (uno cada full_every, o antes si cambió más de max_delta_fraction
+    de las filas) solo se guardan las filas que cambiaron respecto al último completo.
+    keep_last limita cuántos snapshots se conservan, además del de mejor puntaje
+    """
+
+    def __init__(self, directory, prefix, keep_last = None, delta = False, compress = False, full_every = 10,
+                 max_delta_fraction = DELTA_MAX_FRACTION):
+        self.directory = directory
+        self.prefix = prefix
+        self.keep_last = keep_last
+        self.delta = delta
+        self.compress = compress
+        self.full_every = full_every
+        self.max_delta_fraction = max_delta_fraction
+
+        # Snapshots en disco, en orden: (n_game, archivo, archivo base o None)
+        self.snapshots = []
+        self.scores = {}
+
+        # Último snapshot completo encolado, usado para calcular las diferencias, y el último ya escrito en disco
+        self.base = None
+        self.base_name = None
+        self.since_full = 0
+        self.last_full = None
+
+        # El hilo de escritura se inicia con el primer snapshot
+        self.pending = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def save(self, n_game, q_table):
+        """
+        Encola un snapshot y retorna el path del archivo donde quedará. El tipo de snapshot (y su nombre) se decide
+        aquí, la única copia se hace aquí y la escritura en el hilo de fondo
+        """
+
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.thread.start()
+            atexit.register(self.close)
+
+        # Las diferencias se toman respecto al último snapshot completo, no al anterior: así cargar uno solo
+        # requiere su base, y la retención no tiene que conservar cadenas de diferencias
+        rows = None
+        if self.delta and self.base is not None and self.since_full < self.full_every - 1 and not isinstance(q_table, SparseQTable):
+            rows = np.flatnonzero(np.any(q_table != self.base, axis = 1))
+            if len(rows) > self.max_delta_fraction * len(q_table):
+                rows = None
+
+        if isinstance(q_table, SparseQTable):
+            # Las tablas dispersas siempre se guardan completas (solo tienen los estados visitados)
+            name = f"{self.prefix}{n_game}.sparse.npz"
+            self.pending.put((n_game, name, q_table.copy(), None))
+        elif rows is None:
+            # Snapshot completo (sin comprimir se guarda como .npy, igual que antes), también cuando la diferencia
+            # habría sido casi tan grande como uno completo
+            name = f"{self.prefix}{n_game}.npz" if self.compress else f"{self.prefix}{n_game}.npy"
+            table = np.array(q_table, copy = True)
+            self.pending.put((n_game, name, table, None))
+            if self.delta:
+                self.base, self.base_name, self.since_full = table, name, 0
+        else:
+            # Solo las filas que cambiaron desde el último snapshot completo (se copian solo esas)
+            name = f"{self.prefix}{n_game}.delta.npz"
+            self.pending.put((n_game, name, (rows, q_table[rows]), self.base_name))
+            self.since_full += 1
+
+        return os.path.join(self.directory, name)
+
+    def record_score(self, n_game, score):
+        """ Registra el desempeño (mayor es mejor) de un snapshot, el mejor nunca se borra """
+        with self.lock:
+            self.scores[n_game] = score
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                self.pending.task_done()
+                return
+            self.write(*item)
+            self.pending.task_done()
+
+    def write(self, n_game, name, data, base_name):
+        os.makedirs(self.directory, exist_ok = True)
+        path = os.path.join(self.directory, name)
+
+        if isinstance(data, SparseQTable):
+            data.save(path)
+        elif base_name is None:
+            if self.compress:
+                np.savez_compressed(path, table = data)
+            else:
+                np.save(path, data)
+            if self.delta:
+                self.last_full = name
+        else:
+            rows, values = data
+            save = np.savez_compressed if self.compress else np.savez
+            save(path, base = base_name, rows = rows, values = values)
+
+        self.snapshots.append((n_game, name, base_name))
+        self.apply_retention()
+
+    def apply_retention(self):
+        if self.keep_last is None:
+            return
+
+        with self.lock:
+            best = max(self.scores, key = self.scores.get) if self.scores else None
+
+        # Conservamos los últimos keep_last, el de mejor puntaje y los completos de los que dependen
+        kept = {n_game for n_game, _, _ in self.snapshots[-self.keep_last:]}
+        kept.add(best)
+        needed = {base for n_game, _, base in self.snapshots if n_game in kept and base is not None}
+        if self.last_full is not None:
+            needed.add(self.last_full)
+
+        remaining = []
+        for n_game, name, base in self.snapshots:
+            if n_game in kept or name in needed:
+                remaining.append((n_game, name, base))
+            else:
+                os.remove(os.path.join(self.directory, name))
+        self.snapshots = remaining
+
+    def load(self, n_game):
+        """ Reconstruye la Q-Table del snapshot n_game """
+        self.flush()
+        for saved_game, name, _ in self.snapshots:
+            if saved_game == n_game:
+                return load_checkpoint(os.path.join(self.directory, name))
+        raise KeyError(f"No existe un snapshot de la partida {n_game}")
+
+    def flush(self):
+        """ Espera a que se terminen de escribir los snapshots pendientes """
+        if self.thread is not None:
+            self.pending.join()
+
+    def close(self):
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
@@ -1,23 +1,132 @@
 import numpy as np
 import random
-import tensorflow as tf
 import os
 
 # Funciones auxiliares que pueden resultar útiles para tu implementación
-from utils import bfs_search, get_valid_moves
+from utils import bfs_search, get_valid_moves, get_map_context
 
 # Path actual de trabajo
 CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
 
-class NNCat():
-    def __init__(self, position, model_name = 'NNCat.h5'):
-        
+def import_tensorflow():
+    """ Importa TensorFlow solo al necesitarlo, su importación toma varios segundos """
+    import tensorflow as tf
+    return tf
+
+def compile_predict(model):
+    """ Compila la pasada hacia adelante de la red con una firma fija (batch de estados de 4 elementos) """
+
+    tf = import_tensorflow()
+
+    @tf.function(input_signature = [tf.TensorSpec(shape = (None, 4), dtype = tf.float32)])
+    def predict(states):
+        return model(states, training = False)
+
+    return predict
+
+def softmax(x):
+    exp = np.exp(x - x.max(axis = 1, keepdims = True))
+    return exp / exp.sum(axis = 1, keepdims = True)
+
+class NumpyMLP:
+    """ Red densa evaluada solo con NumPy, a partir de los pesos de un modelo de TensorFlow """
+
+    # Funciones de activación soportadas
+    ACTIVATIONS = {
+        "linear": lambda x: x,
+        "relu": lambda x: np.maximum(x, 0),
+        "tanh": np.tanh,
+        "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+        "softmax": softmax,
+    }
+
+    def __init__(self, weights, biases, activations):
+        for activation in activations:
+            if activation not in self.ACTIVATIONS:
+                raise ValueError(f"Activación no soportada: {activation}")
+        self.weights = [np.asarray(w, dtype = np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype = np.float32) for b in biases]
+        self.activations = list(activations)
+
+    @classmethod
+    def from_keras(cls, model):
+        """ Extrae los pesos y activaciones de las capas densas de un modelo de Keras """
+        weights, biases, activations = [], [], []
+        for layer in model.layers:
+            if not layer.get_weights():
+                continue
+            kernel, bias = layer.get_weights()
+            weights.append(kernel)
+            biases.append(bias)
+            activations.append(layer.get_config().get("activation") or "linear")
+        return cls(weights, biases, activations)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        n_layers = len(data["activations"])
+        return cls([data[f"w{i}"] for i in range(n_layers)], [data[f"b{i}"] for i in range(n_layers)], [str(a) for a in data["activations"]])
+
+    def save(self, path):
+        arrays = {"activations": np.array(self.activations)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"w{i}"] = w
+            arrays[f"b{i}"] = b
+        np.savez(path, **arrays)
+
+    def __call__(self, states):
+        x = np.asarray(states, dtype = np.float32)
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            x = self.ACTIVATIONS[activation](x @ w + b)
+        return x
+
+def export_numpy_mlp(model_name, output_name = None):
+    """ Exporta la red guardada en agents/data/model_name a un .npz que se puede evaluar sin TensorFlow """
+
+    tf = import_tensorflow()
+    model = tf.keras.models.load_model(os.path.join(CURRENT_PATH, "data", model_name))
+    output_name = output_name or os.path.splitext(model_name)[0] + ".npz"
+    NumpyMLP.from_keras(model).save(os.path.join(CURRENT_PATH, "data", output_name))
+    return output_name
+
+def distill_policy(model_name, output_name = None, save_outputs = False):
+    """
+    Evalúa la red de agents/data/model_name sobre todos los estados del juego en un solo batch y guarda la acción
+    elegida en cada uno (uint8, una por fila de la Q-Table). Con save_outputs también guarda la salida de la red
+    """
+
+    agent = NeuralAgent(None, model_name)
+    cat_positions, mouse_positions = agent.encoder.decode(np.arange(agent.encoder.n_states))
+    states = np.concatenate([cat_positions, mouse_positions], axis = 1).astype(np.float32)
+    outputs = np.asarray(agent.predict(states))
+
+    output_name = output_name or os.path.splitext(model_name)[0] + "Policy.npy"
+    np.save(os.path.join(CURRENT_PATH, "data", output_name), np.argmax(outputs, axis = 1).astype(np.uint8))
+    if save_outputs:
+        np.save(os.path.join(CURRENT_PATH, "data", os.path.splitext(output_name)[0] + "Outputs.npy"), outputs)
+    return output_name
+
+class NeuralAgent:
+    def __init__(self, position, model_name):
+
         # Posición inicial del agente
         self.pos = position
 
+        # Codificador que traduce un estado de juego al índice de su fila en una tabla de política
+        self.encoder = get_map_context(os.path.join(CURRENT_PATH, "game_map.npy")).encoder
+        self.policy = None
+
         # Cargamos la red del agente (que modela su político)
-        # En caso de usar SciKit Learn, se debe cargar el modelo acordemente
-        self.model = tf.keras.models.load_model(os.path.join(CURRENT_PATH, "data", model_name))
+        # Los archivos .npy son tablas con la acción de cada estado, generadas con distill_policy
+        # Los archivos .npz son redes exportadas con export_numpy_mlp, que se evalúan sin TensorFlow
+        if model_name.endswith(".npy"):
+            self.policy = np.load(os.path.join(CURRENT_PATH, "data", model_name))
+        elif model_name.endswith(".npz"):
+            self.model = NumpyMLP.load(os.path.join(CURRENT_PATH, "data", model_name))
+            self.predict = self.model
+        else:
+            self.model = import_tensorflow().keras.models.load_model(os.path.join(CURRENT_PATH, "data", model_name))
+            self.predict = compile_predict(self.model)
 
     def get_action(self, lab_map, cat_pos, mouse_pos, noise = 0, train = False):
 
@@ -25,8 +134,12 @@ class NNCat():
         if random.random() < noise:
             return random.randint(0, 4)
 
+        # Con una tabla de política, la acción se obtiene directamente de la fila del estado
+        if self.policy is not None:
+            return int(self.policy[self.encoder.encode(cat_pos, mouse_pos)])
+
         # Calculamos el estado actual del juego
-        state = np.array([cat_pos[0], cat_pos[1], mouse_pos[0], mouse_pos[1]])
+        state = np.array([cat_pos[0], cat_pos[1], mouse_pos[0], mouse_pos[1]], dtype = np.float32)
 
         # NOTA: Normalmente la red espera un batch de datos a la vez y no un único vector
         # por lo que usamos el método np.expand_dims(state, axis = 0) para añadir una dimensión
@@ -41,63 +154,42 @@ class NNCat():
         # =====================
 
         # Obtenemos la predicción de la red para el estado actual
-        prediction = self.model(state)
+        prediction = np.asarray(self.predict(state))
 
         # Tomamos la acción con la mayor probabilidad
         move = np.argmax(prediction)
 
         return move
-    
-    # Método vacío, no se utiliza en este tipo de agente
-    def update_policy(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
-        pass
-    
-    # Método vacío, no se utiliza en este tipo de agente
-    def update_exploration(self, n_game):
-        pass
-    
-class NNMouse():
-    def __init__(self, position, model_name = 'NNMouse.h5'):
-        
-        # Posición inicial del agente
-        self.pos = position
 
-        # Cargamos la red del agente (que modela su político)
-        # En caso de usar SciKit Learn, se debe cargar el modelo acordemente
-        self.model = tf.keras.models.load_model(os.path.join(CURRENT_PATH, "data", model_name))
+    # Versión vectorizada de get_action, evalúa la red una sola vez para todas las posiciones
+    def get_actions(self, cat_positions, mouse_positions, noise = 0, train = False):
 
-    def get_action(self, lab_map, cat_pos, mouse_pos, noise = 0, train = False):
+        if self.policy is not None:
+            moves = self.policy[self.encoder.encode(cat_positions, mouse_positions)].astype(np.int64)
+        else:
+            states = np.concatenate([cat_positions, mouse_positions], axis = 1).astype(np.float32)
+            moves = np.argmax(np.asarray(self.predict(states)), axis = 1)
 
-        # Considerar los movimientos como ruidosos, con una probabilidad de hacer uno aleatorio
-        if random.random() < noise:
-            return random.randint(0, 4)
+        # Con probabilidad noise se juega un movimiento aleatorio
+        explore = np.random.random(len(moves)) < noise
+        moves[explore] = np.random.randint(0, 5, size = np.count_nonzero(explore))
 
-        # Calculamos el estado actual del juego
-        state = np.array([cat_pos[0], cat_pos[1], mouse_pos[0], mouse_pos[1]])
+        return moves
 
-        # NOTA: Normalmente la red espera un batch de datos a la vez y no un único vector
-        # por lo que usamos el método np.expand_dims(state, axis = 0) para añadir una dimensión
-        # y tener un vector de tamaño (1, 4) en lugar de (4)
-        state = np.expand_dims(state, axis=0)
-
-        # ===== COMPLETAR =====
-        # Se debe retornar el movimiento que lleve a un mejor estado futuro,
-        # tomando el índice de mayor probabilidad de la salida de la red
-        # Podemos obtener la predicción de un modelo sobre un vector x mediante prediction = model(x)
-        # move = 0
-        # =====================
-        
-        # Obtenemos la predicción de la red para el estado actual
-        prediction = self.model(state)
-
-        # Tomamos la acción con la mayor probabilidad
-        move = np.argmax(prediction)
-        return move
-    
     # Método vacío, no se utiliza en este tipo de agente
     def update_policy(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
         pass
-    
+
     # Método vacío, no se utiliza en este tipo de agente
     def update_exploration(self, n_game):
-        pass
\ No newline at end of file
+        pass
+
+class NNCat(NeuralAgent):
+    def __init__(self, position, model_name = 'NNCat.h5'):
+
+        super().__init__(position, model_name)
+
+class NNMouse(NeuralAgent):
+    def __init__(self, position, model_name = 'NNMouse.h5'):
+
+        super().__init__(position, model_name)
@@ -0,0 +1,117 @@
+import numpy as np
+
+# Filas que se reservan al crear una tabla dispersa (se duplican cada vez que se llenan)
+INITIAL_CAPACITY = 1024
+
+class SparseQTable:
+    """
+    Q-Table que solo guarda las filas de los estados visitados, para mapas donde la tabla completa
+    (|libres|² x 5 valores) no cabe en memoria. Se indexa igual que la tabla densa: q_table[fila],
+    q_table[filas], q_table[fila, acción] y q_table[filas, acciones]; los estados no visitados valen 0
+    """
+
+    # Se comporta como una tabla de dos dimensiones (ver ReinforcedAgent.policy)
+    ndim = 2
+
+    def __init__(self, n_states, n_actions = 5, capacity = INITIAL_CAPACITY):
+        self.n_states = n_states
+        self.n_actions = n_actions
+
+        # Fila de cada estado visitado dentro de values, la fila 0 queda en ceros para los no visitados
+        self.slots = {}
+        self.states = np.zeros(capacity + 1, dtype = np.int64)
+        self.values = np.zeros((capacity + 1, n_actions))
+
+    @property
+    def shape(self):
+        return (self.n_states, self.n_actions)
+
+    @property
+    def nbytes(self):
+        return self.states.nbytes + self.values.nbytes
+
+    def __len__(self):
+        """ Número de estados visitados """
+        return len(self.slots)
+
+    def lookup(self, states):
+        """ Fila de values de cada estado (0 si no ha sido visitado), acepta un estado o un array de ellos """
+
+        if np.ndim(states) == 0:
+            return self.slots.get(int(states), 0)
+
+        states = np.asarray(states)
+        get = self.slots.get
+        slots = np.fromiter((get(state, 0) for state in states.ravel().tolist()), dtype = np.int64, count = states.size)
+        return slots.reshape(states.shape)
+
+    def allocate(self, states):
+        """ Igual que lookup, pero reservando una fila para los estados que aún no tienen """
+
+        if np.ndim(states) == 0:
+            state = int(states)
+            slot = self.slots.get(state)
+            return self.add_state(state) if slot is None else slot
+
+        states = np.asarray(states)
+        slots = self.lookup(states)
+        for index in np.flatnonzero(slots.ravel() == 0):
+            state = int(states.flat[index])
+            slot = self.slots.get(state)
+            slots.flat[index] = self.add_state(state) if slot is None else slot
+        return slots
+
+    def add_state(self, state):
+        slot = len(self.slots) + 1
+
+        # Si no queda espacio, duplicamos la capacidad
+        if slot == len(self.values):
+            self.states = np.concatenate([self.states, np.zeros_like(self.states)])
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+
+        self.slots[state] = slot
+        self.states[slot] = state
+        return slot
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            states, actions = key
+            return self.values[self.lookup(states), actions]
+        return self.values[self.lookup(key)]
+
+    def __setitem__(self, key, value):
+        states, actions = key if isinstance(key, tuple) else (key, slice(None))
+
+        # allocate puede reemplazar values al crecer, así que se llama antes de indexarlo
+        slots = self.allocate(states)
+        self.values[slots, actions] = value
+
+    def add_at(self, states, actions, values):
+        """ Equivalente a np.add.at(q_table, (states, actions), values), acumulando los pares repetidos """
+        slots = self.allocate(states)
+        np.add.at(self.values, (slots, actions), values)
+
+    def copy(self):
+        table = SparseQTable(self.n_states, self.n_actions, capacity = 0)
+        table.slots = dict(self.slots)
+        table.states = self.states[:len(self.slots) + 1].copy()
+        table.values = self.values[:len(self.slots) + 1].copy()
+        return table
+
+    def save(self, path):
+        """ Guarda los estados visitados y sus valores en un .npz (ver load) """
+        n = len(self.slots) + 1
+        np.savez(path, n_states = self.n_states, states = self.states[1:n], values = self.values[1:n])
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls.from_arrays(int(data["n_states"]), data["states"], data["values"])
+
+    @classmethod
+    def from_arrays(cls, n_states, states, values):
+        table = cls(n_states, values.shape[1], capacity = len(states))
+        table.slots = {int(state): slot for slot, state in enumerate(states.tolist(), start = 1)}
+        table.states[1:] = states
+        table.values[1:] = values
+        return table
@@ -0,0 +1,62 @@
+import subprocess
+import importlib
+import time
+import sys
+import os
+
+# Módulo y clase de cada agente, el módulo se importa recién al crear el agente
+# (así, por ejemplo, TensorFlow solo se carga si se crea un agente neuronal)
+AGENTS = {
+    "base_cat": ("agents.baseline", "BaseCat"),
+    "base_mouse": ("agents.baseline", "BaseMouse"),
+    "rl_cat": ("agents.reinforced", "RLCat"),
+    "rl_mouse": ("agents.reinforced", "RLMouse"),
+    "nn_cat": ("agents.neural", "NNCat"),
+    "nn_mouse": ("agents.neural", "NNMouse"),
+}
+
+# Tiempo máximo (en segundos) para iniciar un proceso, crear el juego y los agentes no neuronales
+COLD_START_TARGET = 1.0
+
+# Path desde donde se ejecuta el proyecto
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+def get_agent_class(name):
+    """ Importa el módulo del agente y retorna su clase """
+
+    if name not in AGENTS:
+        raise ValueError(f"Agente desconocido: {name} (disponibles: {', '.join(AGENTS)})")
+    module_name, class_name = AGENTS[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+def make_agent(name, position = None, table = None, **kwargs):
+    """
+    Crea un agente a partir de su nombre, por ejemplo make_agent("rl_mouse", game.mouse_pos, table = "QTableMouse1000.npy").
+    table es el archivo de la Q-Table o de la red del agente (dentro de agents/data), los demás argumentos se entregan al agente
+    """
+
+    agent_class = get_agent_class(name)
+    if table is None:
+        return agent_class(position, **kwargs)
+    return agent_class(position, table, **kwargs)
+
+def measure_cold_start(cat_name, mouse_name, cat_table = None, mouse_table = None):
+    """ Mide cuánto tarda un proceso nuevo en crear el juego (sin visualización) y un par de agentes """
+
+    code = (
+        "from chase_game import ChaseGame\n"
+        "from agents.registry import make_agent\n"
+        "game = ChaseGame(visualization = False)\n"
+        f"make_agent({cat_name!r}, game.cat_pos, table = {cat_table!r})\n"
+        f"make_agent({mouse_name!r}, game.mouse_pos, table = {mouse_table!r})\n"
+    )
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd = ROOT_PATH, check = True)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    # Inicio en frío de los caminos que no usan redes neuronales
+    for cat_name, mouse_name in (("base_cat", "base_mouse"), ("rl_cat", "rl_mouse")):
+        elapsed = measure_cold_start(cat_name, mouse_name)
+        status = "OK" if elapsed < COLD_START_TARGET else "LENTO"
+        print(f"{cat_name} vs {mouse_name} | Inicio en frío: {elapsed:.3f} s | Objetivo: {COLD_START_TARGET} s | {status}")
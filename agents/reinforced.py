@@ -3,7 +3,9 @@ import random
 import os
 
 # Funciones auxiliares que pueden resultar útiles para tu implementación
-from utils import bfs_search, get_valid_moves
+from utils import bfs_search, get_valid_moves, get_distance_oracle, get_map_context
+from agents.checkpoints import CheckpointManager, load_checkpoint
+from agents.qstore import SparseQTable
 
 # Path actual de trabajo
 CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -21,9 +23,50 @@ MOUSE_EXPLORATION_DECAY_RATE = 0.0001
 MOUSE_LR = 0.1
 MOUSE_DISCOUNT_RATE = 0.1
 
+# Snapshots de la Q-Table (se escriben en segundo plano): cuántos conservar (None = todos), si guardar solo
+# las filas que cambiaron desde el último snapshot completo y si comprimirlos (con estos dos en False se
+# guardan los mismos QTable{Agente}{n}.npy de siempre)
+CHECKPOINT_KEEP_LAST = None
+CHECKPOINT_DELTA = False
+CHECKPOINT_COMPRESS = False
+
+# Cada cuántas partidas se guarda un snapshot de la Q-Table (None no guarda ninguno)
+SAVE_EVERY = 1000
+
+# Sobre este número de estados (|libres|², 10^7 son 400 MB en float64) la Q-Table nueva solo guarda los estados visitados
+DENSE_MAX_STATES = 10 ** 7
+
+# Formatos en los que se puede exportar una Q-Table para evaluación ("policy" guarda solo la mejor acción)
+EXPORT_DTYPES = ("float32", "float16", "policy")
+
+def export_table(table_name, output_name = None, dtype = "policy"):
+    """
+    Exporta la Q-Table de agents/data/table_name en un formato más liviano para evaluar: float32 o float16
+    (2 y 4 veces menos memoria, con float16 pueden cambiar las acciones de estados con valores casi empatados)
+    o "policy", un uint8 con la mejor acción de cada estado (40 veces menos).
+    Los archivos exportados se cargan igual que cualquier Q-Table, idealmente con mmap_mode = 'r'
+    """
+
+    if dtype not in EXPORT_DTYPES:
+        raise ValueError(f"Formato desconocido: {dtype} (disponibles: {', '.join(EXPORT_DTYPES)})")
+
+    path = os.path.join(CURRENT_PATH, "data", table_name)
+    q_table = load_checkpoint(path) if table_name.endswith(".npz") else np.load(path, mmap_mode = "r")
+
+    # El argmax se calcula sobre la tabla original, así la política es la misma que con float64
+    if dtype == "policy":
+        output = np.argmax(q_table, axis = 1).astype(np.uint8)
+    else:
+        output = np.asarray(q_table, dtype = dtype)
+
+    base_name = table_name[:-len(".delta.npz")] if table_name.endswith(".delta.npz") else os.path.splitext(table_name)[0]
+    output_name = output_name or f"{base_name}{dtype.capitalize()}.npy"
+    np.save(os.path.join(CURRENT_PATH, "data", output_name), output)
+    return output_name
+
 class ReinforcedAgent:
 
-    def __init__(self, position, table_name = None, alpha = 0.2, gamma = 0.9):
+    def __init__(self, position, table_name = None, alpha = 0.2, gamma = 0.9, mmap_mode = None, map_path = None, sparse = None):
 
         # Posición inicial del agente
         self.pos = position
@@ -31,32 +74,49 @@ class ReinforcedAgent:
         self.alpha = alpha
 
         # ===== CONSTRUCCIÓN DE LA Q-TABLE ===== #
-        # Cargamos el mapa y buscamos las posiciones libres dentro de este
-        free_positions = []
-        lab_map = np.load(os.path.join(CURRENT_PATH, "game_map.npy"))
-        for x in range(lab_map.shape[0]):
-            for y in range(lab_map.shape[1]):
-                if lab_map[x, y] == 0:
-                    free_positions.append((x, y))
-
-        # Diccionario que recibe una tupla del estado de juego de key y retorna el índice de su fila asociada en la Q-Table
-        self.states_index = dict()
-        index = 0
-        for cat_pos in free_positions:
-            for mouse_pos in free_positions:
-                self.states_index[tuple([cat_pos[0], cat_pos[1], mouse_pos[0], mouse_pos[1]])] = index
-                index += 1
+        # Codificador (compartido por todos los agentes) que traduce un estado de juego al índice de su fila
+        # en la Q-Table (fila = id[gato] * |libres| + id[ratón], en el orden en que se recorre el mapa)
+        self.encoder = get_map_context(map_path or os.path.join(CURRENT_PATH, "game_map.npy")).encoder
             
         # Tasa de exploración del agente
         self.exploration_rate = 1
         
         # En caso de haber una Q-Table preexistente, utilizarla
+        # (en mapas grandes, o con sparse = True, una tabla que solo reserva memoria para los estados visitados)
         if table_name is None:
-            self.q_table = np.zeros((index, 5))
+            if sparse is None:
+                sparse = self.encoder.n_states > DENSE_MAX_STATES
+            self.q_table = SparseQTable(self.encoder.n_states, 5) if sparse else np.zeros((self.encoder.n_states, 5))
         
         # En caso de no entregar una Q-Table, crear una llena de ceros
+        # (con mmap_mode = 'r' la tabla se lee desde disco y se comparte entre procesos en lugar de copiarse)
+        elif table_name.endswith(".npz"):
+            self.q_table = load_checkpoint(os.path.join(CURRENT_PATH, "data", table_name))
         else:
-            self.q_table = np.load(os.path.join(CURRENT_PATH, "data", table_name))
+            self.q_table = np.load(os.path.join(CURRENT_PATH, "data", table_name), mmap_mode = mmap_mode)
+
+        # Las tablas de política (una acción uint8 por estado, ver export_table) se consultan directamente,
+        # sin calcular el argmax de cada fila. Solo sirven para jugar, no para seguir entrenando
+        self.policy = self.q_table if self.q_table.ndim == 1 else None
+
+        # Magnitud de las actualizaciones de la Q-Table desde la última consulta (ver pop_update_stats)
+        self.update_count = 0
+        self.update_abs_sum = 0.0
+        self.update_abs_max = 0.0
+
+        # Snapshots de la Q-Table durante el entrenamiento (ver la propiedad checkpoints)
+        self._checkpoints = None
+
+    @property
+    def checkpoints(self):
+        """
+        Administrador de los snapshots de la Q-Table, creado recién con el primer uso: los agentes que solo
+        juegan (evaluación, torneos) nunca lo crean
+        """
+        if self._checkpoints is None:
+            self._checkpoints = CheckpointManager(os.path.join(CURRENT_PATH, "data"), self.checkpoint_prefix,
+                                                  CHECKPOINT_KEEP_LAST, CHECKPOINT_DELTA, CHECKPOINT_COMPRESS)
+        return self._checkpoints
 
 
     # Obtener la acción a ejecutar dado el estado del juego
@@ -72,42 +132,58 @@ class ReinforcedAgent:
             if random.random() < noise:
                 return random.randint(0, 4)
         
-        # Calculamos el estado actual del juego
-        state = (cat_pos[0], cat_pos[1], mouse_pos[0], mouse_pos[1])
-
-
         # ===== COMPLETAR =====
         # Se debe retornar el movimiento que lleve a un mejor estado futuro, basándose en la Q-Table
         # move = 0
         # =====================
 
         # Obtener el índice del estado actual en la tabla Q
-        state_index = self.states_index[state]
+        state_index = self.encoder.encode(cat_pos, mouse_pos)
 
         # Obtener el movimiento que tiene el valor más alto en la tabla Q para el estado actual
+        if self.policy is not None:
+            return int(self.policy[state_index])
         move = np.argmax(self.q_table[state_index])
 
         return move
+
+    # Versión vectorizada de get_action, para un array de posiciones de gatos y ratones
+    def get_actions(self, cat_positions, mouse_positions, noise = 0, train = False):
+
+        # Movimiento con el valor más alto en la Q-Table para cada estado
+        states = self.encoder.encode(cat_positions, mouse_positions)
+        if self.policy is not None:
+            moves = self.policy[states].astype(np.int64)
+        else:
+            moves = np.argmax(self.q_table[states], axis = 1)
+
+        # Con probabilidad exploration_rate (al entrenar) o noise (al evaluar) se juega un movimiento aleatorio
+        random_rate = self.exploration_rate if train else noise
+        explore = np.random.random(len(moves)) < random_rate
+        moves[explore] = np.random.randint(0, 5, size = np.count_nonzero(explore))
+
+        return moves
     
     def get_reward(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
         pass
+
+    # Versión vectorizada de get_reward, recibe arrays de acciones y posiciones
+    def get_reward_batch(self, lab_map, actions, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
+        pass
     
     def update_policy(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
-        state = (old_cat_pos[0], old_cat_pos[1], old_mouse_pos[0], old_mouse_pos[1])
-        new_state = (new_cat_pos[0], new_cat_pos[1], new_mouse_pos[0], new_mouse_pos[1])
-        
         reward = self.get_reward(lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos)
 
         # ===== COMPLETAR =====
         # Se debe actualizar el valor asociado al par estado-acción en la Q-Table
-        # recuerda que la acción jugada fue action en el estado state
-        # self.q_table[self.states_index[state], action] = 0
+        # recuerda que la acción jugada fue action en el estado (old_cat_pos, old_mouse_pos)
+        # self.q_table[self.encoder.encode(old_cat_pos, old_mouse_pos), action] = 0
         # =====================
 
         # Obtener el índice del estado actual en la tabla Q
-        q_prime = np.max(self.q_table[self.states_index[new_state]])
+        q_prime = np.max(self.q_table[self.encoder.encode(new_cat_pos, new_mouse_pos)])
         # Obtener el índice del estado actual en la tabla Q
-        index = self.states_index[state]
+        index = self.encoder.encode(old_cat_pos, old_mouse_pos)
         old_q_value = self.q_table[index, action]
 
 
@@ -119,11 +195,58 @@ class ReinforcedAgent:
         learned_value = reward + self.gamma * q_prime - old_q_value
 
         #learned_value = r + self.gamma * q_prime - old_q_value
-        self.q_table[index, action] += self.alpha * learned_value
+        step = self.alpha * learned_value
+        self.q_table[index, action] += step
+
+        # Acumulamos el tamaño del cambio, usado para saber si la tabla ya convergió
+        step = abs(step)
+        self.update_count += 1
+        self.update_abs_sum += step
+        if step > self.update_abs_max:
+            self.update_abs_max = step
+
+        # La recompensa se retorna para reutilizarla (por ejemplo, en ReplayTrainer.observe) sin volver a calcularla
+        return reward
 
         # print('valor aprendido', learned_value)
         # print('sumado', self.alpha * learned_value)
 
+    def update_batch(self, states, actions, rewards, next_states, done, weights = None):
+        """
+        Aplica la misma actualización de update_policy a un lote de transiciones (filas de la Q-Table).
+        En las transiciones terminales (done) no se considera el valor del estado siguiente, y weights
+        (opcional) escala el paso de cada transición. Retorna el error de diferencia temporal de cada una
+        """
+
+        # Mejor valor de cada estado siguiente
+        q_prime = np.max(self.q_table[next_states], axis = 1) * ~np.asarray(done, dtype = bool)
+
+        learned_value = rewards + self.gamma * q_prime - self.q_table[states, actions]
+        step = self.alpha * learned_value if weights is None else self.alpha * weights * learned_value
+
+        # np.add.at acumula correctamente los pares estado-acción que se repiten en el lote
+        if isinstance(self.q_table, SparseQTable):
+            self.q_table.add_at(states, actions, step)
+        else:
+            np.add.at(self.q_table, (states, actions), step)
+
+        steps = np.abs(step)
+        self.update_count += len(steps)
+        self.update_abs_sum += float(steps.sum())
+        self.update_abs_max = max(self.update_abs_max, float(steps.max(initial = 0)))
+
+        return learned_value
+
+    def pop_update_stats(self):
+        """ Número de actualizaciones y media y máximo de |cambio en la Q-Table| desde la última llamada """
+
+        count, mean = self.update_count, self.update_abs_sum / self.update_count if self.update_count else 0.0
+        maximum = self.update_abs_max
+        self.update_count = 0
+        self.update_abs_sum = 0.0
+        self.update_abs_max = 0.0
+        return count, mean, maximum
+
     
     def update_exploration(self, n_game):
         # Disminuir la tasa de exploración a medida que el agente juega más juegos
@@ -131,9 +254,20 @@ class ReinforcedAgent:
 
 class RLCat(ReinforcedAgent):
 
-    def __init__(self, position, table_path = None, alpha = CAT_LR, gamma = CAT_DISCOUNT_RATE):
+    # Prefijo de los snapshots de la Q-Table (QTableCat1000.npy, ...)
+    checkpoint_prefix = "QTableCat"
+
+    def __init__(self, position, table_path = None, alpha = CAT_LR, gamma = CAT_DISCOUNT_RATE, mmap_mode = None,
+                 max_exploration_rate = CAT_MAX_EXPLORATION_RATE, min_exploration_rate = CAT_MIN_EXPLORATION_RATE,
+                 exploration_decay_rate = CAT_EXPLORATION_DECAY_RATE, save_every = SAVE_EVERY, map_path = None, sparse = None):
 
-        super().__init__(position, table_path, alpha = CAT_LR, gamma = CAT_DISCOUNT_RATE)
+        super().__init__(position, table_path, alpha = alpha, gamma = gamma, mmap_mode = mmap_mode, map_path = map_path, sparse = sparse)
+
+        # Parámetros de la exploración (por defecto, los hiperparámetros de arriba)
+        self.max_exploration_rate = max_exploration_rate
+        self.min_exploration_rate = min_exploration_rate
+        self.exploration_decay_rate = exploration_decay_rate
+        self.save_every = save_every
 
     def get_reward(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
         # ===== COMPLETAR =====
@@ -141,8 +275,9 @@ class RLCat(ReinforcedAgent):
         # reward = 0
         # =====================
 
-        distancia_old = len(bfs_search(lab_map, old_cat_pos, old_mouse_pos))
-        distancia_new = len(bfs_search(lab_map, new_cat_pos, new_mouse_pos))
+        oracle = get_distance_oracle(lab_map)
+        distancia_old = oracle.distance(old_cat_pos, old_mouse_pos)
+        distancia_new = oracle.distance(new_cat_pos, new_mouse_pos)
 
         # print("old_cat_pos: ", old_cat_pos[0], old_cat_pos[1])
         # print("new_cat_pos: ", new_cat_pos[0], new_cat_pos[1])
@@ -160,6 +295,15 @@ class RLCat(ReinforcedAgent):
             reward = -5
 
         return reward
+
+    def get_reward_batch(self, lab_map, actions, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
+        oracle = get_distance_oracle(lab_map)
+        distancia_old = oracle.distance(old_cat_pos, old_mouse_pos)
+        distancia_new = oracle.distance(new_cat_pos, new_mouse_pos)
+
+        # Mismas recompensas que get_reward: captura, acercarse, mantenerse o alejarse
+        caught = np.all(new_cat_pos == new_mouse_pos, axis = 1)
+        return np.select([caught, distancia_new < distancia_old, distancia_new == distancia_old], [30, 5, 0], -5)
     
     def update_exploration(self, n_game):
         # ===== COMPLETAR =====
@@ -168,27 +312,30 @@ class RLCat(ReinforcedAgent):
         # =====================
 
         # Disminuir la tasa de exploración a medida que el gato juega más juegos
-        self.exploration_rate = CAT_MIN_EXPLORATION_RATE + (CAT_MAX_EXPLORATION_RATE - CAT_MIN_EXPLORATION_RATE) * np.exp(-CAT_EXPLORATION_DECAY_RATE * n_game)
+        self.exploration_rate = self.min_exploration_rate + (self.max_exploration_rate - self.min_exploration_rate) * np.exp(-self.exploration_decay_rate * n_game)
 
 
-        # Cada 1000 partidas, aprovecharemos de guardar la tabla de desempeño del agente
-        if n_game % 1000 == 0:
-            np.save(os.path.join(CURRENT_PATH, "data", f"QTableCat{n_game}.npy"), self.q_table)
-            print(f"Epsilon: {self.exploration_rate} | Guardando QTable en agents/data/QTableCat{n_game}.npy")
-
-    def update_exploration(self, n_game):
-        # Disminuir la tasa de exploración a medida que el gato juega más juegos
-        self.exploration_rate = CAT_MIN_EXPLORATION_RATE + (CAT_MAX_EXPLORATION_RATE - CAT_MIN_EXPLORATION_RATE) * np.exp(-CAT_EXPLORATION_DECAY_RATE * n_game)
-
-        # Cada 1000 partidas, aprovecharemos de guardar la tabla de desempeño del agente
-        if n_game % 1000 == 0:
-            np.save(os.path.join(CURRENT_PATH, "data", f"QTableCat{n_game}.npy"), self.q_table)
-            print(f"Epsilon: {self.exploration_rate} | Guardando QTable en agents/data/QTableCat{n_game}.npy")
+        # Cada save_every partidas (1000 por defecto), aprovecharemos de guardar la tabla de desempeño del agente
+        if self.save_every is not None and n_game % self.save_every == 0:
+            path = self.checkpoints.save(n_game, self.q_table)
+            print(f"Epsilon: {self.exploration_rate} | Guardando QTable en {os.path.relpath(path, os.path.dirname(CURRENT_PATH))}")
     
 class RLMouse(ReinforcedAgent):
-    def __init__(self, position, table_path = None, alpha = MOUSE_LR, gamma = MOUSE_DISCOUNT_RATE):
 
-        super().__init__(position, table_path, alpha = MOUSE_LR, gamma = MOUSE_DISCOUNT_RATE)
+    # Prefijo de los snapshots de la Q-Table (QTableMouse1000.npy, ...)
+    checkpoint_prefix = "QTableMouse"
+
+    def __init__(self, position, table_path = None, alpha = MOUSE_LR, gamma = MOUSE_DISCOUNT_RATE, mmap_mode = None,
+                 max_exploration_rate = MOUSE_MAX_EXPLORATION_RATE, min_exploration_rate = MOUSE_MIN_EXPLORATION_RATE,
+                 exploration_decay_rate = MOUSE_EXPLORATION_DECAY_RATE, save_every = SAVE_EVERY, map_path = None, sparse = None):
+
+        super().__init__(position, table_path, alpha = alpha, gamma = gamma, mmap_mode = mmap_mode, map_path = map_path, sparse = sparse)
+
+        # Parámetros de la exploración (por defecto, los hiperparámetros de arriba)
+        self.max_exploration_rate = max_exploration_rate
+        self.min_exploration_rate = min_exploration_rate
+        self.exploration_decay_rate = exploration_decay_rate
+        self.save_every = save_every
 
     def get_reward(self, lab_map, action, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
         # ===== COMPLETAR =====
@@ -196,8 +343,9 @@ class RLMouse(ReinforcedAgent):
         # reward = 0
         # =====================
 
-        distancia_old = len(bfs_search(lab_map, old_cat_pos, old_mouse_pos))
-        distancia_new = len(bfs_search(lab_map, new_cat_pos, new_mouse_pos))
+        oracle = get_distance_oracle(lab_map)
+        distancia_old = oracle.distance(old_cat_pos, old_mouse_pos)
+        distancia_new = oracle.distance(new_cat_pos, new_mouse_pos)
 
         # Si el ratón es capturado por el gato, dar una recompensa negativa
         if new_cat_pos[0] == new_mouse_pos[0] and new_cat_pos[1] == new_mouse_pos[1]:
@@ -214,6 +362,15 @@ class RLMouse(ReinforcedAgent):
 
 
         return reward
+
+    def get_reward_batch(self, lab_map, actions, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos):
+        oracle = get_distance_oracle(lab_map)
+        distancia_old = oracle.distance(old_cat_pos, old_mouse_pos)
+        distancia_new = oracle.distance(new_cat_pos, new_mouse_pos)
+
+        # Mismas recompensas que get_reward: captura, acercarse, alejarse o mantenerse
+        caught = np.all(new_cat_pos == new_mouse_pos, axis = 1)
+        return np.select([caught, distancia_new < distancia_old, distancia_new > distancia_old], [-30, -5, 5], 2)
     
     def update_exploration(self, n_game):
         # ===== COMPLETAR =====
@@ -222,9 +379,9 @@ class RLMouse(ReinforcedAgent):
         # =====================
 
         # Disminuir la tasa de exploración a medida que el ratón juega más juegos
-        self.exploration_rate = MOUSE_MIN_EXPLORATION_RATE + (MOUSE_MAX_EXPLORATION_RATE - MOUSE_MIN_EXPLORATION_RATE) * np.exp(-MOUSE_EXPLORATION_DECAY_RATE * n_game)
+        self.exploration_rate = self.min_exploration_rate + (self.max_exploration_rate - self.min_exploration_rate) * np.exp(-self.exploration_decay_rate * n_game)
 
-        # Cada 1000 partidas, aprovecharemos de guardar la tabla de desempeño del agente
-        if n_game % 1000 == 0:
-            np.save(os.path.join(CURRENT_PATH, "data", f"QTableMouse{n_game}.npy"), self.q_table)
-            print(f"Epsilon: {self.exploration_rate} | Guardando QTable en agents/data/QTableMouse{n_game}.npy")
+        # Cada save_every partidas (1000 por defecto), aprovecharemos de guardar la tabla de desempeño del agente
+        if self.save_every is not None and n_game % self.save_every == 0:
+            path = self.checkpoints.save(n_game, self.q_table)
+            print(f"Epsilon: {self.exploration_rate} | Guardando QTable en {os.path.relpath(path, os.path.dirname(CURRENT_PATH))}")
@@ -0,0 +1,206 @@
+import numpy as np
+
+# Tamaño del buffer, transiciones por lote y cada cuántos pasos se repasa un lote (dos transiciones repasadas
+# por paso jugado: con lotes más grandes o más seguidos el repaso cuesta más que el resto del paso)
+REPLAY_CAPACITY = 100000
+REPLAY_BATCH_SIZE = 32
+REPLAY_EVERY = 16
+
+# Muestreo por prioridad: cuánto pesa el error en la probabilidad (0 = uniforme) y cuánto se corrige el sesgo
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA = 0.4
+
+# Prioridad mínima, así ninguna transición deja de muestrearse
+PRIORITY_EPSILON = 1e-3
+
+# Hijos por nodo del árbol de sumas del muestreo por prioridad
+SUMTREE_FANOUT = 64
+
+class SumTree:
+    """
+    Árbol de sumas ancho, guardado por niveles de las hojas (las prioridades) a la raíz. Cada grupo de fanout
+    hermanos guarda además sus sumas acumuladas, así bajar un nivel al buscar es una comparación por fila sin
+    sumar nada. Con pocos niveles (3 para 100000 hojas) actualizar o buscar un lote completo son unas pocas
+    operaciones de numpy por nivel. Las hojas cambiadas se propagan juntas antes de la siguiente búsqueda
+    """
+
+    def __init__(self, capacity, fanout = SUMTREE_FANOUT):
+        self.fanout = fanout
+
+        # Valor de cada nodo por nivel, con un múltiplo de fanout nodos (los de relleno quedan en 0), hasta la raíz
+        self.levels = []
+        size = capacity
+        while True:
+            size = -(-size // fanout) * fanout
+            self.levels.append(np.zeros(size))
+            if size == fanout:
+                break
+            size //= fanout
+        self.levels.append(np.zeros(1))
+        self.priorities = self.levels[0]
+
+        # Sumas acumuladas de cada grupo de hermanos, con un 0 al inicio: prefix[g, c] suma los hijos antes del c
+        self.prefixes = [np.zeros((len(level) // fanout, fanout + 1)) for level in self.levels[:-1]]
+
+        # Hojas cambiadas cuyas sumas aún no se propagan
+        self.pending = []
+
+    def total(self):
+        self.propagate()
+        return self.levels[-1][0]
+
+    def update(self, indices, priorities):
+        """ Cambia la prioridad de las hojas indices (una o un array de ellas), las sumas se propagan al buscar """
+
+        self.priorities[indices] = priorities
+        if np.ndim(indices) == 0:
+            self.pending.append(int(indices))
+        else:
+            self.pending.extend(np.asarray(indices).tolist())
+
+    def propagate(self):
+        """ Recalcula las sumas de los grupos con hojas pendientes, un nivel a la vez """
+
+        if not self.pending:
+            return
+
+        # Un grupo repetido solo se escribe varias veces con las mismas sumas, porque sus hijos ya están actualizados
+        groups = np.array(self.pending) // self.fanout
+        self.pending = []
+        for values, prefix, parents in zip(self.levels[:-1], self.prefixes, self.levels[1:]):
+            prefix[groups, 1:] = np.cumsum(values.reshape(-1, self.fanout)[groups], axis = 1)
+            parents[groups] = prefix[groups, -1]
+            groups = groups // self.fanout
+
+    def find(self, values):
+        """ Hoja en que cae cada suma acumulada de values (entre 0 y total) """
+
+        self.propagate()
+        values = np.array(values, dtype = np.float64)
+        rows = np.arange(len(values))
+        nodes = np.zeros(len(values), dtype = np.int64)
+        for prefix in reversed(self.prefixes):
+            # Primer hijo cuya suma acumulada alcanza el valor, y lo que queda del valor dentro de ese hijo
+            sums = prefix[nodes]
+            child = (sums[:, 1:-1] < values[:, None]).sum(axis = 1)
+            values -= sums[rows, child]
+            nodes = nodes * self.fanout + child
+        return nodes
+
+class ReplayBuffer:
+    """
+    Buffer circular de transiciones (fila, acción, recompensa, fila siguiente, terminal) en arrays preasignados.
+    Con prioritized, los lotes se muestrean en proporción al último error de cada transición (ver update_priorities)
+    """
+
+    def __init__(self, capacity = REPLAY_CAPACITY, n_states = None, prioritized = False, alpha = PRIORITY_ALPHA, seed = None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+
+        # Las filas caben en int32 salvo en mapas muy grandes
+        state_dtype = np.int32 if n_states is None or n_states <= np.iinfo(np.int32).max else np.int64
+        self.states = np.zeros(capacity, dtype = state_dtype)
+        self.actions = np.zeros(capacity, dtype = np.int32)
+        self.rewards = np.zeros(capacity, dtype = np.float32)
+        self.next_states = np.zeros(capacity, dtype = state_dtype)
+        self.done = np.zeros(capacity, dtype = bool)
+
+        # Posición donde se escribe la siguiente transición y número de transiciones guardadas
+        self.position = 0
+        self.size = 0
+
+        # Las transiciones nuevas entran con la mayor prioridad vista, así se muestrean al menos una vez
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, state, action, reward, next_state, done):
+        """ Agrega una transición, reemplazando la más antigua si el buffer está lleno """
+
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.done[index] = done
+        if self.tree is not None:
+            self.tree.update(index, self.max_priority)
+
+        self.position = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size, beta = PRIORITY_BETA):
+        """
+        Retorna los índices, las transiciones (filas, acciones, recompensas, filas siguientes, terminales) y el peso
+        de cada una en la actualización (1 con muestreo uniforme, corrige el sesgo del muestreo por prioridad)
+        """
+
+        if self.tree is None:
+            indices = self.rng.integers(self.size, size = batch_size)
+            weights = np.ones(batch_size)
+        else:
+            # Una muestra en cada uno de batch_size tramos iguales de la suma total
+            total = self.tree.total()
+            values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+            indices = np.minimum(self.tree.find(values), self.size - 1)
+
+            probabilities = self.tree.priorities[indices] / total
+            weights = (self.size * probabilities) ** -beta
+            weights /= weights.max()
+
+        batch = (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices], self.done[indices])
+        return indices, batch, weights
+
+    def update_priorities(self, indices, td_errors):
+        """ Nueva prioridad de las transiciones muestreadas, a partir de su error de diferencia temporal """
+
+        if self.tree is None:
+            return
+        priorities = (np.abs(td_errors) + PRIORITY_EPSILON) ** self.alpha
+        self.tree.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+class ReplayTrainer:
+    """
+    Guarda las transiciones de un agente de Q-Learning a medida que juega y cada replay_every pasos
+    repasa un lote del buffer con ReinforcedAgent.update_batch (además de la actualización en línea)
+    """
+
+    def __init__(self, agent, buffer, batch_size = REPLAY_BATCH_SIZE, replay_every = REPLAY_EVERY, beta = PRIORITY_BETA):
+        self.agent = agent
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.replay_every = replay_every
+        self.beta = beta
+        self.steps = 0
+
+    def observe(self, action, reward, old_cat_pos, new_cat_pos, old_mouse_pos, new_mouse_pos, done):
+        """
+        Guarda la transición de un paso y repasa un lote si corresponde. reward es la recompensa que ya calculó
+        update_policy en este paso (la retorna), así no se vuelve a calcular
+        """
+
+        agent = self.agent
+        self.buffer.append(agent.encoder.encode(old_cat_pos, old_mouse_pos), action, reward, agent.encoder.encode(new_cat_pos, new_mouse_pos), done)
+
+        self.steps += 1
+        if self.steps % self.replay_every == 0 and len(self.buffer) >= self.batch_size:
+            self.replay()
+
+    def replay(self):
+        indices, batch, weights = self.buffer.sample(self.batch_size, self.beta)
+        td_errors = self.agent.update_batch(*batch, weights = weights)
+        self.buffer.update_priorities(indices, td_errors)
+        return td_errors
+
+def make_replay_trainer(agent, capacity = REPLAY_CAPACITY, prioritized = True, seed = None, **kwargs):
+    """ ReplayTrainer con su buffer para un agente de Q-Learning (None para los agentes que no aprenden de una Q-Table) """
+
+    if not hasattr(agent, "update_batch"):
+        return None
+    buffer = ReplayBuffer(capacity, n_states = agent.encoder.n_states, prioritized = prioritized, seed = seed)
+    return ReplayTrainer(agent, buffer, **kwargs)
@@ -0,0 +1,279 @@
+import importlib.util
+import subprocess
+import argparse
+import platform
+import tempfile
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+from chase_game import ChaseGame
+from evaluation import play_games, seed_all
+from utils import bfs_search, get_valid_moves, get_map_context
+from agents.registry import make_agent
+
+# Path desde donde se ejecutan los benchmarks, los resultados se guardan en benchmarks/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+BENCHMARKS_PATH = os.path.join(CURRENT_PATH, "benchmarks")
+MAP_PATH = os.path.join(CURRENT_PATH, "game_map.npy")
+
+# Tamaños de mapa a medir, como cuántas veces se repite el mapa del juego por lado (1 = 11x11, 2 = 22x22, ...)
+MAP_SCALES = (1, 2, 4)
+
+# Repeticiones de cada medición, se reporta la más rápida (la menos afectada por otros procesos de la máquina)
+REPEATS = 10
+
+# Duración mínima de cada repetición: las mediciones cortas se ejecutan varias veces seguidas hasta sumarla
+MIN_SAMPLE_TIME = 0.05
+
+# Tamaño de cada medición: pasos del juego, llamadas a cada función y partidas de entrenamiento
+GAME_STEPS = 20000
+CALLS = 2000
+TRAIN_GAMES = 200
+
+# bfs_search y los agentes neuronales son mucho más lentos por llamada, así que se miden con menos llamadas
+SLOW_CALLS = 200
+
+# bfs_search vuelve a encolar casillas ya encoladas, en mapas más grandes que esto una sola llamada tarda segundos
+BFS_MAX_SIDE = 22
+
+# Agentes a medir, como (nombre en agents.registry, archivo de la Q-Table o red)
+AGENT_SPECS = (
+    ("base_cat",),
+    ("base_mouse",),
+    ("rl_cat", "Test1/QTableCat13000.npy"),
+    ("rl_mouse", "Test1/QTableMouse13000.npy"),
+    ("nn_cat", "NNCat.h5"),
+    ("nn_mouse", "NNMouse.h5"),
+)
+
+# Semilla de todas las mediciones, así cada corrida juega exactamente lo mismo
+SEED = 0
+
+# Empeoramiento relativo a partir del cual una medición se considera una regresión. En mediciones más ruidosas
+# se tolera además SPREAD_FACTOR veces su dispersión entre repeticiones (la mayor de ambas corridas)
+REGRESSION_THRESHOLD = 0.1
+SPREAD_FACTOR = 2
+
+# Cómo se obtiene el valor reportado de cada unidad a partir de los segundos que tardó una ejecución y su trabajo
+# (pasos, llamadas o partidas)
+UNITS = {
+    "steps/s": lambda seconds, amount: amount / seconds,
+    "games/s": lambda seconds, amount: amount / seconds,
+    "us/call": lambda seconds, amount: seconds / amount * 1e6,
+}
+
+def time_loops(function, loops):
+    """ Segundos promedio de loops ejecuciones de function, cada una desde la misma semilla """
+
+    elapsed = 0.0
+    for _ in range(loops):
+        seed_all(SEED)
+        start = time.perf_counter()
+        function()
+        elapsed += time.perf_counter() - start
+    return elapsed / loops
+
+def measure(functions, repeats = REPEATS, min_time = MIN_SAMPLE_TIME):
+    """
+    Segundos que tarda una ejecución de cada función de functions: el mínimo de repeats repeticiones de al menos
+    min_time segundos, junto con la dispersión relativa de las repeticiones ((mediana - mínimo) / mínimo).
+    Las repeticiones se intercalan (una de cada función por ronda), así un período en que la máquina anda
+    más lenta afecta a una repetición de cada medición y no a todas las de una sola
+    """
+
+    # Una primera ejecución (que además calienta los cachés) indica cuántas hacen falta por repetición
+    loops = [max(1, int(np.ceil(min_time / max(time_loops(function, 1), 1e-9)))) for function in functions]
+
+    times = [[] for _ in functions]
+    for _ in range(repeats):
+        for function, n, samples in zip(functions, loops, times):
+            samples.append(time_loops(function, n))
+    return [(min(samples), (float(np.median(samples)) - min(samples)) / min(samples)) for samples in times]
+
+def scaled_map(scale):
+    """ Mapa del juego repetido scale veces por lado """
+    return np.tile(np.load(MAP_PATH), (scale, scale))
+
+def random_positions(lab_map, n, seed = SEED):
+    """ n pares (gato, ratón) de posiciones libres elegidas al azar """
+
+    free_positions = np.argwhere(lab_map == 0)
+    rng = np.random.default_rng(seed)
+    return free_positions[rng.integers(len(free_positions), size = n)], free_positions[rng.integers(len(free_positions), size = n)]
+
+def bench_game_step(map_path, steps = GAME_STEPS):
+    """ ChaseGame.game_step con movimientos aleatorios: retorna la función a medir y sus pasos """
+
+    game = ChaseGame(visualization = False, map_path = map_path)
+    moves = np.random.default_rng(SEED).integers(0, 5, size = (steps, 2)).tolist()
+
+    def run():
+        game.reset()
+        for cat_move, mouse_move in moves:
+            game.game_step(cat_move, mouse_move)
+            if game.end:
+                game.reset()
+
+    return run, steps
+
+def bench_calls(function, args):
+    """ Una llamada de function por cada tupla de argumentos de args: retorna la función a medir y sus llamadas """
+
+    def run():
+        for arguments in args:
+            function(*arguments)
+
+    return run, len(args)
+
+def bench_training(games = TRAIN_GAMES):
+    """ El ciclo de train_reinforced_agent.py con ambos agentes aprendiendo: retorna la función a medir y sus partidas """
+
+    game = ChaseGame(visualization = False)
+
+    def run():
+        cat = make_agent("rl_cat", game.cat_pos, save_every = None)
+        mouse = make_agent("rl_mouse", game.mouse_pos, save_every = None)
+        play_games(game, cat, mouse, games, train = True)
+
+    return run, games
+
+def agent_available(name, table):
+    """ Los agentes neuronales necesitan TensorFlow y su red en agents/data """
+
+    if not name.startswith("nn_"):
+        return True
+    return importlib.util.find_spec("tensorflow") is not None and os.path.exists(os.path.join(CURRENT_PATH, "agents", "data", table))
+
+def run_benchmarks(scales = MAP_SCALES, calls = CALLS, slow_calls = SLOW_CALLS, game_steps = GAME_STEPS, train_games = TRAIN_GAMES, verbose = True):
+    """ Ejecuta todas las mediciones y retorna un diccionario nombre -> {value, unit, higher_is_better, spread} """
+
+    # Primero se preparan todas las mediciones (nombre, (función, trabajo), unidad, mayor es mejor), luego se miden juntas
+    benchmarks = []
+
+    def add(name, bench, unit, higher_is_better):
+        benchmarks.append((name, bench, unit, higher_is_better))
+
+    # Simulador y funciones auxiliares, en mapas de distintos tamaños
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            lab_map = scaled_map(scale)
+            size = f"{lab_map.shape[0]}x{lab_map.shape[1]}"
+            map_path = os.path.join(directory, f"map{scale}.npy")
+            np.save(map_path, lab_map)
+
+            add(f"game_step/{size}", bench_game_step(map_path, game_steps), "steps/s", True)
+
+            cat_positions, mouse_positions = random_positions(lab_map, calls)
+            slow_args = [(lab_map, cat, mouse) for cat, mouse in zip(cat_positions[:slow_calls], mouse_positions[:slow_calls])]
+            if max(lab_map.shape) <= BFS_MAX_SIDE:
+                add(f"bfs_search/{size}", bench_calls(bfs_search, slow_args), "us/call", False)
+            elif verbose:
+                print(f"{'bfs_search/' + size:<40} omitido (mapa más grande que BFS_MAX_SIDE)")
+            add(f"get_valid_moves/{size}", bench_calls(get_valid_moves, [(lab_map, mouse) for mouse in mouse_positions]), "us/call", False)
+
+    # Agentes, en el mapa del juego (las Q-Tables y redes existentes son de ese mapa)
+    lab_map = get_map_context(MAP_PATH).lab_map
+    for name, *table in AGENT_SPECS:
+        table = table[0] if table else None
+        if not agent_available(name, table):
+            if verbose:
+                print(f"{'get_action/' + name:<40} omitido (requiere TensorFlow y agents/data/{table})")
+            continue
+
+        agent = make_agent(name, np.zeros(2, dtype = int), table = table)
+        n_calls = slow_calls if name.startswith("nn_") else calls
+        cat_positions, mouse_positions = random_positions(lab_map, n_calls)
+        args = [(lab_map, cat, mouse) for cat, mouse in zip(cat_positions, mouse_positions)]
+        add(f"get_action/{name}", bench_calls(agent.get_action, args), "us/call", False)
+
+    # Ciclo de entrenamiento completo
+    add("training/rl_vs_rl", bench_training(train_games), "games/s", True)
+
+    if verbose:
+        print(f"Midiendo {len(benchmarks)} benchmarks ({REPEATS} repeticiones intercaladas de cada uno)...", flush = True)
+    timings = measure([run for _, (run, _), _, _ in benchmarks])
+
+    results = {}
+    for (name, (_, amount), unit, higher_is_better), (seconds, spread) in zip(benchmarks, timings):
+        value = UNITS[unit](seconds, amount)
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better, "spread": spread}
+        if verbose:
+            print(f"{name:<40} {value:>14.2f} {unit:<8} ±{spread:.1%}")
+    return results
+
+def metadata():
+    """ Información de la corrida, para saber qué se está comparando """
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = CURRENT_PATH, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": SEED,
+        "repeats": REPEATS,
+        "min_sample_time": MIN_SAMPLE_TIME,
+    }
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    with open(path, "w") as file:
+        json.dump({"meta": metadata(), "results": results}, file, indent = 2)
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)["results"]
+
+def compare(baseline, results, threshold = REGRESSION_THRESHOLD, verbose = True):
+    """
+    Compara dos corridas medición a medición y retorna los nombres de las que empeoraron más que threshold
+    (relativo a baseline), o más que SPREAD_FACTOR veces su dispersión si es mayor. Las mediciones que no
+    están en ambas corridas se ignoran
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        old, new = baseline[name]["value"], result["value"]
+        change = (new - old) / old
+        worse = -change if result["higher_is_better"] else change
+        tolerance = max(threshold, SPREAD_FACTOR * max(baseline[name].get("spread", 0), result.get("spread", 0)))
+        status = "REGRESIÓN" if worse > tolerance else "OK"
+        if worse > tolerance:
+            regressions.append(name)
+        if verbose:
+            print(f"{name:<40} {old:>14.2f} -> {new:>14.2f} {result['unit']:<8} {change:+8.1%} (tol. {tolerance:.1%}) {status}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks del simulador, los agentes y el entrenamiento")
+    parser.add_argument("--output", help = "archivo JSON donde guardar los resultados (por defecto en benchmarks/)")
+    parser.add_argument("--compare", help = "archivo JSON de una corrida anterior con el que comparar")
+    parser.add_argument("--threshold", type = float, default = REGRESSION_THRESHOLD, help = "empeoramiento relativo tolerado")
+    parser.add_argument("--quick", action = "store_true", help = "mediciones 10 veces más cortas, solo en el mapa del juego")
+    arguments = parser.parse_args()
+
+    if arguments.quick:
+        results = run_benchmarks(scales = (1,), calls = CALLS // 10, slow_calls = SLOW_CALLS // 10, game_steps = GAME_STEPS // 10, train_games = TRAIN_GAMES // 10)
+    else:
+        results = run_benchmarks()
+
+    output = arguments.output or os.path.join(BENCHMARKS_PATH, f"{time.strftime('%Y%m%d_%H%M%S')}.json")
+    save_results(results, output)
+    print("Resultados guardados en", os.path.relpath(output, CURRENT_PATH))
+
+    if arguments.compare:
+        regressions = compare(load_results(arguments.compare), results, arguments.threshold)
+        if regressions:
+            print("Regresiones:", ", ".join(regressions))
+            sys.exit(1)
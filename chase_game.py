@@ -1,9 +1,13 @@
-import pygame
 import numpy as np
 import time
 import os
 import random
 
+from utils import MOVES, get_legal_moves, get_map_context
+
+# pygame se importa solo al crear un juego con visualización (ver load_pygame)
+pygame = None
+
 # Tiempo entre cada movimiento del juego
 TIME_DELAY = 0.1
 
@@ -28,45 +32,149 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
+# Tamaño (ancho, alto) de los cuadros grabados con ChaseGame(record = True)
+RECORD_SIZE = (WIDTH // 4, HEIGHT // 4)
+
 # Detalles de la pantalla, utilizados para dibujar el mapa de juego
 WIN_INFO = ((WIDTH - MAP_WIDTH) // 2, (HEIGHT - MAP_HEIGHT) // 2, MAP_WIDTH, MAP_HEIGHT)
 
 # Path desde donde se accede al juego, utilizado para cargar el mapa
 CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
 
-class ChaseGame():
-    def __init__(self, visualization = True):
-        # Cargamos el mapa de juego
-        self.lab_map = np.load(os.path.join(CURRENT_PATH, "game_map.npy"))
+def load_pygame():
+    """ Importa pygame la primera vez que se necesita dibujar el juego """
+    global pygame
+    if pygame is None:
+        import pygame
+    return pygame
 
-        # Calculamos las posiciones libres de obstáculos
-        free_positions = []
-        for x in range(self.lab_map.shape[0]):
-            for y in range(self.lab_map.shape[1]):
-                if self.lab_map[x, y] == 0:
-                    free_positions.append((x, y))
+class MapRenderer():
+    """ Dibuja el juego sobre una superficie de pygame, con el fondo estático (paredes y grilla) precalculado """
 
-        # Ubicamos al gato en una posición aleatoria del mapa
-        self.cat_pos = np.array(random.choice(free_positions))
-        self.mouse_pos = self.cat_pos
+    def __init__(self, lab_map, surface):
+        self.lab_map = lab_map
+        self.surface = surface
 
-        # Colocamos al ratón en una posición aleatoria del mapa, al menos a 6 pasos del gato
-        while np.sum(np.abs(self.cat_pos - self.mouse_pos)) < 6:
-            self.mouse_pos = np.array(random.choice(free_positions))
+        # La grilla se guarda aparte para volver a dibujarla encima de los agentes
+        self.grid = self.build_grid()
+        self.background = self.build_background()
 
-        # Duración del juego actual
-        self.t = 0
+        # Casillas dibujadas en el cuadro anterior, que deben restaurarse con el fondo
+        self.dirty_rects = None
+
+    def cell_rect(self, position):
+        # Detalles sobre el espacio a dibujar
+        x_zero, y_zero, map_width, map_height = WIN_INFO
+        n_rows = self.lab_map.shape[0]
+        n_cols = self.lab_map.shape[1]
+
+        return pygame.Rect(x_zero + position[0] * map_width // n_rows, y_zero + position[1] * map_height // n_cols, map_width // n_rows, map_height // n_cols)
+
+    def build_grid(self):
+        # Superficie transparente (todo lo que tenga el color clave no se dibuja)
+        grid = pygame.Surface((WIDTH, HEIGHT))
+        grid.fill(WHITE)
+        grid.set_colorkey(WHITE)
+
+        # Detalles sobre el espacio a dibujar
+        x_zero, y_zero, map_width, map_height = WIN_INFO
+        n_rows = self.lab_map.shape[0]
+        n_cols = self.lab_map.shape[1]
+
+        # Dibujamos las líneas de la grilla
+        for i in range(n_rows + 1):
+            pygame.draw.line(grid, GREY, (x_zero + i * map_width // n_rows, y_zero), (x_zero + i * map_width // n_rows, y_zero + map_height), 1)
+        for j in range(n_cols + 1):
+            pygame.draw.line(grid, GREY, (x_zero, y_zero + j * map_height // n_cols), (x_zero + map_width, y_zero + j * map_height // n_cols), 1)
+
+        # Dibujamos los bordes del mapa
+        pygame.draw.line(grid, BLACK, (x_zero, y_zero), (x_zero + map_width, y_zero), BORDER_WIDTH)
+        pygame.draw.line(grid, BLACK, (x_zero, y_zero), (x_zero, y_zero + map_height), BORDER_WIDTH)
+        pygame.draw.line(grid, BLACK, (x_zero + map_width, y_zero + map_height), (x_zero + map_width, y_zero), BORDER_WIDTH)
+        pygame.draw.line(grid, BLACK, (x_zero + map_width, y_zero + map_height), (x_zero, y_zero + map_height), BORDER_WIDTH)
+
+        return grid
+
+    def build_background(self):
+        background = pygame.Surface((WIDTH, HEIGHT))
+
+        # Llenamos la pantalla de un color gris azulado
+        background.fill(BLUE_GREY)
+
+        # Dibujamos el fondo del mapa
+        x_zero, y_zero, map_width, map_height = WIN_INFO
+        pygame.draw.rect(background, LIGHT_GREY, (x_zero, y_zero, map_width, map_height))
+
+        # Dibujamos las paredes
+        for position in np.argwhere(self.lab_map == 1):
+            background.fill(BLACK, self.cell_rect(position))
+
+        # Dibujamos la grilla sobre el mapa
+        background.blit(self.grid, (0, 0))
+
+        return background
+
+    def draw(self, cat_pos, mouse_pos, end):
+        """ Dibuja un nuevo cuadro y retorna las zonas de la pantalla que cambiaron """
+
+        # El primer cuadro dibuja todo el fondo, los siguientes solo restauran las casillas del cuadro anterior
+        if self.dirty_rects is None:
+            self.surface.blit(self.background, (0, 0))
+            updated = [self.surface.get_rect()]
+        else:
+            for rect in self.dirty_rects:
+                self.surface.blit(self.background, rect, rect)
+            updated = list(self.dirty_rects)
+
+        # En caso de terminar la partida, dibujar al ratón y el gato encima del otro con color azul
+        if end:
+            agents = [(mouse_pos, BLUE)]
+
+        # Dibujamos al gato y al ratón
+        else:
+            agents = [(cat_pos, RED), (mouse_pos, GREEN)]
+
+        self.dirty_rects = []
+        for position, color in agents:
+            rect = self.cell_rect(position)
+            self.surface.fill(color, rect)
+
+            # La grilla queda encima de los agentes
+            self.surface.blit(self.grid, rect, rect)
+
+            # Se incluye el borde de la casilla, que puede quedar bajo las líneas más gruesas
+            self.dirty_rects.append(rect.inflate(BORDER_WIDTH, BORDER_WIDTH))
+
+        return updated + self.dirty_rects
+
+class ChaseGame():
+    def __init__(self, visualization = True, map_path = None, offscreen = False, record = False, viewer = None):
+        # Cargamos el mapa de juego (el archivo se lee una sola vez, y se comparte entre instancias)
+        self.context = get_map_context(map_path or os.path.join(CURRENT_PATH, "game_map.npy"))
+        self.lab_map = self.context.lab_map
 
         # Indica si tener visualización (una pantalla) o no
         self.visualization = visualization
 
-        # Indica si la partida actual ha finalizado o no
-        self.end = False
-        
+        # Sin pantalla (offscreen) se dibuja en memoria y sin esperar entre pasos, útil para grabar partidas
+        self.offscreen = offscreen
+
+        # Cuadros grabados (si record es True), ver save_recording
+        self.record = record
+        self.frames = []
+
+        # Vista en vivo en otro hilo (renderer.RendererThread), recibe copias del estado sin detener la simulación
+        self.viewer = viewer
+        self.game_index = 0
+
         if self.visualization:
+            if self.offscreen:
+                os.environ["SDL_VIDEODRIVER"] = "dummy"
+            load_pygame()
             pygame.init()
             self.win = pygame.display.set_mode((WIDTH, HEIGHT))
             pygame.display.set_caption("Cat and Mouse Game")
+            self.renderer = MapRenderer(self.lab_map, self.win)
         
         # Movimientos posibles y sus efectos en la posición del agente
         self.moves = {
@@ -77,53 +185,39 @@ class ChaseGame():
             4: np.array([0, 0])
         }
 
-    def draw_grid(self):
-        # Detalles sobre el espacio a dibujar
-        x_zero, y_zero, map_width, map_height = WIN_INFO
-        n_rows = self.lab_map.shape[0]
-        n_cols = self.lab_map.shape[1]
+        self.new_game()
 
-        # Dibujamos las líneas de la grilla
-        for i in range(n_rows + 1):
-            pygame.draw.line(self.win, GREY, (x_zero + i * map_width // n_rows, y_zero), (x_zero + i * map_width // n_rows, y_zero + map_height), 1)
-        for j in range(n_cols + 1):
-            pygame.draw.line(self.win, GREY, (x_zero, y_zero + j * map_height // n_cols), (x_zero + map_width, y_zero + j * map_height // n_cols), 1)
+    def new_game(self):
+        # Posiciones libres de obstáculos
+        free_positions = self.context.free_positions
 
-        # Dibujamos los bordes del mapa
-        pygame.draw.line(self.win, BLACK, (x_zero, y_zero), (x_zero + map_width, y_zero), BORDER_WIDTH)
-        pygame.draw.line(self.win, BLACK, (x_zero, y_zero), (x_zero, y_zero + map_height), BORDER_WIDTH)
-        pygame.draw.line(self.win, BLACK, (x_zero + map_width, y_zero + map_height), (x_zero + map_width, y_zero), BORDER_WIDTH)
-        pygame.draw.line(self.win, BLACK, (x_zero + map_width, y_zero + map_height), (x_zero, y_zero + map_height), BORDER_WIDTH)
+        # Ubicamos al gato en una posición aleatoria del mapa
+        self.cat_pos = free_positions[random.randrange(len(free_positions))].copy()
+        self.mouse_pos = self.cat_pos
 
-    def draw_map(self):
-        # Llenamos la pantalla de un color gris azulado
-        self.win.fill(BLUE_GREY)
+        # Colocamos al ratón en una posición aleatoria del mapa, al menos a 6 pasos del gato
+        while np.sum(np.abs(self.cat_pos - self.mouse_pos)) < 6:
+            self.mouse_pos = free_positions[random.randrange(len(free_positions))].copy()
 
-        # Detalles sobre el espacio a dibujar
-        x_zero, y_zero, map_width, map_height = WIN_INFO
-        n_rows = self.lab_map.shape[0]
-        n_cols = self.lab_map.shape[1]
+        # Duración del juego actual
+        self.t = 0
 
-        # Dibujamos el fondo del mapa
-        pygame.draw.rect(self.win, LIGHT_GREY, (x_zero, y_zero, map_width, map_height))
+        # Indica si la partida actual ha finalizado o no
+        self.end = False
 
-        # Dibujamos las paredes
-        for i in range(n_rows):
-            for j in range(n_cols):
-                if self.lab_map[i, j] == 1:
-                    pygame.draw.rect(self.win, BLACK, (x_zero + i * map_width // n_rows, y_zero + j * map_height // n_cols, map_width // n_rows, map_height // n_cols))
+    def draw_map(self):
+        # Dibujamos el nuevo estado sobre el fondo precalculado, retorna las zonas de la pantalla que cambiaron
+        return self.renderer.draw(self.cat_pos, self.mouse_pos, self.end)
 
-        # En caso de terminar la partida, dibujar al ratón y el gato encima del otro con color azul
-        if self.end:
-            pygame.draw.rect(self.win, BLUE, (x_zero + self.mouse_pos[0] * map_width // n_rows, y_zero + self.mouse_pos[1] * map_height // n_cols, map_width // n_rows, map_height // n_cols))
-        
-        # Dibujamos al gato y al ratón
-        else:
-            pygame.draw.rect(self.win, RED, (x_zero + self.cat_pos[0] * map_width // n_rows, y_zero + self.cat_pos[1] * map_height // n_cols, map_width // n_rows, map_height // n_cols))
-            pygame.draw.rect(self.win, GREEN, (x_zero + self.mouse_pos[0] * map_width // n_rows, y_zero + self.mouse_pos[1] * map_height // n_cols, map_width // n_rows, map_height // n_cols))
+    def record_frame(self):
+        # Guardamos el cuadro actual, reducido a RECORD_SIZE, como un array (alto, ancho, 3)
+        frame = pygame.transform.smoothscale(self.win, RECORD_SIZE)
+        self.frames.append(pygame.surfarray.array3d(frame).transpose(1, 0, 2))
 
-        # Dibujamos la grilla sobre el mapa
-        self.draw_grid()
+    def save_recording(self, path):
+        """ Guarda los cuadros grabados como un array de numpy (cuadros, alto, ancho, 3) y los descarta de memoria """
+        np.save(path, np.array(self.frames, dtype=np.uint8))
+        self.frames = []
 
     def game_step(self, cat_move, mouse_move):
         
@@ -162,41 +256,112 @@ class ChaseGame():
             if self.t > MAX_STEPS - 1:
                 self.end = True
 
-            # Dibujar el nuevo estado del juego
+            # Dibujar el nuevo estado del juego, actualizando solo las casillas que cambiaron
             if self.visualization:
-                self.draw_map()
-                pygame.display.flip()
+                pygame.display.update(self.draw_map())
+
+                if self.record:
+                    self.record_frame()
 
                 # Delay hasta el siguiente paso
-                time.sleep(TIME_DELAY)
+                if not self.offscreen:
+                    time.sleep(TIME_DELAY)
+
+            if self.viewer is not None:
+                self.viewer.submit(self.game_index, self.cat_pos, self.mouse_pos, self.end)
 
     def valid_move(self, agent, move):
+        """ Indica si el movimiento lleva al agente ("cat" o "mouse") a una casilla libre dentro del mapa """
 
-        # Verifica si un movimiento del gato es válido
-        if agent == "cat":
-            new_cat_pos = self.cat_pos + self.moves[move]
-            # Si el movimiento lo lleva a una posición dentro del mapa
-            if np.min(new_cat_pos) < 0 or np.max(new_cat_pos) >= self.lab_map.shape[0]:
-                return False
-            # Si el movimiento lo lleva a una pared
-            elif self.lab_map[new_cat_pos[0], new_cat_pos[1]] == 1:
-                return False
-            else:
-                return True
-            
-        # Verifica si un movimiento del ratón es válido
-        elif agent == "mouse":
-            new_mouse_pos = self.mouse_pos + self.moves[move]
-            # Si el movimiento lo lleva a una posición dentro del mapa
-            if np.min(new_mouse_pos) < 0 or np.max(new_mouse_pos) >= self.lab_map.shape[0]:
-                return False
-            # Si el movimiento lo lleva a una pared
-            elif self.lab_map[new_mouse_pos[0], new_mouse_pos[1]] == 1:
-                return False
-            else:
-                return True
+        # Basta consultar la máscara de movimientos legales de la casilla actual del agente
+        position = self.cat_pos if agent == "cat" else self.mouse_pos
+        return bool(self.context.legal_moves.masks[position[0], position[1]] >> int(move) & 1)
     
     def reset(self):
         if self.visualization:
             print(f"El ratón sobrevivió durante {self.t} turnos")
-        self.__init__(self.visualization)
+
+        # Solo se sortean nuevas posiciones, el mapa y la pantalla se reutilizan
+        self.game_index += 1
+        self.new_game()
+
+
+class BatchedChaseGame():
+    """ Versión vectorizada de ChaseGame, que avanza N partidas a la vez (sin visualización) """
+
+    def __init__(self, n_games, lab_map = None, seed = None):
+        # Cargamos el mapa de juego, en caso de no entregarlo
+        if lab_map is None:
+            lab_map = get_map_context(os.path.join(CURRENT_PATH, "game_map.npy")).lab_map
+        self.lab_map = lab_map
+        self.free_positions = np.argwhere(self.lab_map == 0)
+        self.legal_moves = get_legal_moves(self.lab_map)
+
+        # Generador de números aleatorios propio, para poder reproducir las partidas
+        self.rng = np.random.default_rng(seed)
+
+        # Movimientos posibles y sus efectos en la posición del agente
+        self.moves = MOVES
+
+        # Estado de las N partidas
+        self.n_games = n_games
+        self.cat_pos = np.zeros((n_games, 2), dtype=np.int64)
+        self.mouse_pos = np.zeros((n_games, 2), dtype=np.int64)
+        self.t = np.zeros(n_games, dtype=np.int64)
+        self.reset_games(np.ones(n_games, dtype=bool))
+
+    def reset_games(self, mask):
+        """ Reinicia en su lugar las partidas indicadas por mask, con las mismas reglas que ChaseGame """
+
+        # Ubicamos al gato en una posición aleatoria del mapa
+        indices = np.flatnonzero(mask)
+        self.cat_pos[indices] = self.free_positions[self.rng.integers(len(self.free_positions), size=len(indices))]
+        self.t[indices] = 0
+
+        # Colocamos al ratón en una posición aleatoria del mapa, al menos a 6 pasos del gato
+        while len(indices) > 0:
+            self.mouse_pos[indices] = self.free_positions[self.rng.integers(len(self.free_positions), size=len(indices))]
+            too_close = np.sum(np.abs(self.cat_pos[indices] - self.mouse_pos[indices]), axis=1) < 6
+            indices = indices[too_close]
+
+    def valid_moves(self, positions, moves):
+        """ Indica, para cada partida, si el movimiento lleva a una casilla libre dentro del mapa """
+
+        return self.legal_moves.is_legal(positions, moves)
+
+    def game_step(self, cat_moves, mouse_moves, auto_reset = True):
+        """
+        Avanza un paso todas las partidas. Retorna las posiciones tras el paso, un arreglo que indica qué partidas
+        terminaron y la duración de cada una; las partidas terminadas se reinician luego si auto_reset es True
+        """
+
+        cat_moves = np.asarray(cat_moves)
+        mouse_moves = np.asarray(mouse_moves)
+
+        # Avanzamos un paso la duración
+        self.t += 1
+
+        # Posiciones anteriores, utilizadas para revisar si pasan uno sobre otro
+        old_cat_pos = self.cat_pos.copy()
+        old_mouse_pos = self.mouse_pos.copy()
+
+        # Los movimientos inválidos se juegan como quedarse quieto
+        self.cat_pos += self.moves[cat_moves] * self.valid_moves(old_cat_pos, cat_moves)[:, None]
+        self.mouse_pos += self.moves[mouse_moves] * self.valid_moves(old_mouse_pos, mouse_moves)[:, None]
+
+        # Si se encuentran en la misma posición, o pasaron uno sobre otro (chocan), terminar el juego
+        caught = np.all(self.cat_pos == self.mouse_pos, axis=1)
+        swapped = np.all(self.cat_pos == old_mouse_pos, axis=1) & np.all(self.mouse_pos == old_cat_pos, axis=1)
+        self.cat_pos[swapped] = self.mouse_pos[swapped]
+
+        # Automáticamente terminar el juego a los MAX_STEPS pasos
+        done = caught | swapped | (self.t > MAX_STEPS - 1)
+
+        new_cat_pos = self.cat_pos.copy()
+        new_mouse_pos = self.mouse_pos.copy()
+        steps = self.t.copy()
+
+        if auto_reset and done.any():
+            self.reset_games(done)
+
+        return new_cat_pos, new_mouse_pos, done, steps
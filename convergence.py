@@ -0,0 +1,113 @@
+import numpy as np
+
+from agents.qstore import SparseQTable
+
+# Cada cuántas partidas se revisa si las Q-Tables convergieron (y se juega la evaluación greedy)
+CHECK_EVERY = 1000
+
+# Partidas de la evaluación greedy (sin exploración ni ruido) de cada revisión
+EVAL_GAMES = 100
+
+# Umbrales de convergencia (None para no considerar la señal): media y máximo de |cambio en la Q-Table| en la ventana,
+# fracción de estados visitados cuya acción greedy cambió y mejora relativa de la evaluación respecto a la mejor anterior.
+# El tamaño de los cambios no baja mientras se sigue explorando (los valores siguen creciendo), por eso no se usa por defecto
+MEAN_UPDATE_THRESHOLD = None
+MAX_UPDATE_THRESHOLD = None
+POLICY_CHANGE_THRESHOLD = 0.01
+EVAL_IMPROVEMENT_THRESHOLD = 0.02
+
+# Revisiones seguidas bajo todos los umbrales para considerar que una tabla convergió
+PATIENCE = 3
+
+def greedy_actions(q_table):
+    """
+    Acción greedy de cada estado visitado (con algún valor distinto de 0) y la máscara de los visitados.
+    En una tabla dispersa, indexadas por la fila de cada estado dentro de values (que no cambia al agregar estados)
+    """
+
+    values = q_table.values[:len(q_table) + 1] if isinstance(q_table, SparseQTable) else q_table
+    return np.argmax(values, axis = 1), np.any(values != 0, axis = 1)
+
+class ConvergenceMonitor:
+    """
+    Señales de convergencia de la Q-Table de un agente, medidas en cada revisión (cada CHECK_EVERY partidas):
+    magnitud de las actualizaciones, fracción de estados cuya acción greedy cambió y mejora de la evaluación.
+    converged se vuelve True cuando todas las señales con umbral quedan bajo él durante patience revisiones seguidas.
+    higher_is_better indica si el agente busca más pasos (el ratón) o menos (el gato)
+    """
+
+    def __init__(self, agent, name, higher_is_better, mean_update_threshold = MEAN_UPDATE_THRESHOLD, max_update_threshold = MAX_UPDATE_THRESHOLD,
+                 policy_change_threshold = POLICY_CHANGE_THRESHOLD, eval_improvement_threshold = EVAL_IMPROVEMENT_THRESHOLD, patience = PATIENCE):
+        self.agent = agent
+        self.name = name
+        self.higher_is_better = higher_is_better
+        self.thresholds = {
+            "mean_update": mean_update_threshold,
+            "max_update": max_update_threshold,
+            "policy_change": policy_change_threshold,
+            "eval_improvement": eval_improvement_threshold,
+        }
+        self.patience = patience
+        self.reset()
+
+    def reset(self):
+        """ Reinicia la cuenta de revisiones seguidas (por ejemplo, tras reducir la exploración del agente) """
+        self.streak = 0
+        self.converged = False
+        self.last_greedy = None
+        self.best_eval = None
+
+    def check(self, eval_steps = None):
+        """ Mide las señales de la ventana que termina, actualiza converged y retorna las señales medidas """
+
+        count, mean_update, max_update = self.agent.pop_update_stats()
+        greedy, visited = greedy_actions(self.agent.q_table)
+
+        # Los estados visitados por primera vez en esta ventana cuentan como cambios
+        policy_change = None
+        if self.last_greedy is not None:
+            previous, previous_visited = self.last_greedy
+            n = len(previous)
+            changed = np.count_nonzero(visited[:n] & ((greedy[:n] != previous) | ~previous_visited)) + np.count_nonzero(visited[n:])
+            policy_change = changed / max(np.count_nonzero(visited), 1)
+        self.last_greedy = (greedy, visited)
+
+        # Las evaluaciones cortas son ruidosas, así que se comparan con la mejor anterior: sin mejora, la señal es <= 0
+        eval_improvement = None
+        if eval_steps is not None:
+            if self.best_eval is not None:
+                gain = eval_steps - self.best_eval if self.higher_is_better else self.best_eval - eval_steps
+                eval_improvement = gain / max(self.best_eval, 1)
+            if self.best_eval is None or eval_improvement > 0:
+                self.best_eval = eval_steps
+
+        signals = {"updates": count, "mean_update": mean_update, "max_update": max_update, "policy_change": policy_change,
+                   "eval_improvement": eval_improvement}
+
+        # Una señal que aún no se puede medir (primera revisión) no cumple su umbral
+        below = all(signals[name] is not None and signals[name] < threshold
+                    for name, threshold in self.thresholds.items() if threshold is not None)
+        self.streak = self.streak + 1 if below and count > 0 else 0
+        self.converged = self.streak >= self.patience
+        return signals
+
+    def line(self, signals):
+        """ Señales de una revisión en una línea, con el formato de los reportes de train_reinforced_agent.py """
+
+        policy_change = "-" if signals["policy_change"] is None else f"{100 * signals['policy_change']:.2f}%"
+        eval_improvement = "-" if signals["eval_improvement"] is None else f"{100 * signals['eval_improvement']:+.1f}%"
+        return (f"{self.name} | Mean dQ: {signals['mean_update']:.4f} | Max dQ: {signals['max_update']:.3f} | "
+                f"Policy Changed: {policy_change} | Eval Improvement: {eval_improvement} | Streak: {self.streak}/{self.patience}")
+
+def reduce_exploration(agent):
+    """ Deja la exploración del agente en su mínimo de aquí en adelante (update_exploration usa max_exploration_rate) """
+
+    agent.max_exploration_rate = agent.min_exploration_rate
+    agent.exploration_rate = agent.min_exploration_rate
+
+def make_monitor(agent, name, higher_is_better, **kwargs):
+    """ Monitor de convergencia de un agente de Q-Learning (None para los agentes que no aprenden de una Q-Table) """
+
+    if not hasattr(agent, "pop_update_stats") or agent.policy is not None:
+        return None
+    return ConvergenceMonitor(agent, name, higher_is_better, **kwargs)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+
+import numpy as np
+
+from utils import MOVES, BFS_MOVE_ORDER, MapContext
+
+# Path desde donde se accede al juego, los sets de datos se guardan en dataset_cache/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+CACHE_PATH = os.path.join(CURRENT_PATH, "dataset_cache")
+
+# Roles para los que se pueden generar sets de datos
+ROLES = ("cat", "mouse")
+
+def map_hash(lab_map):
+    """ Identificador del mapa, cambia si cambia cualquier casilla o su tamaño """
+    return hashlib.sha1(str(lab_map.shape).encode() + lab_map.astype(np.uint8).tobytes()).hexdigest()[:16]
+
+def move_scores(context, role):
+    """
+    Puntaje de cada movimiento en cada estado (filas de la Q-Table), a partir de la tabla de distancias más cortas.
+    El gato busca acercarse al ratón y el ratón alejarse del gato (desempatando por distancia Manhattan).
+    Los movimientos inválidos tienen puntaje -inf
+    """
+
+    encoder = context.encoder
+    distances = context.oracle.distances.astype(np.float64)
+    cat_ids, mouse_ids = np.divmod(np.arange(encoder.n_states), encoder.n_free)
+
+    # Un movimiento es válido si cambia la casilla del agente, o si es quedarse quieto
+    own_ids = cat_ids if role == "cat" else mouse_ids
+    destinations = context.move_table[own_ids]
+    valid = (destinations != own_ids[:, None]) | (np.arange(len(MOVES)) == 4)
+
+    if role == "cat":
+        scores = -distances[destinations, mouse_ids[:, None]]
+    else:
+        manhattan = np.abs(encoder.free_positions[destinations] - encoder.free_positions[cat_ids][:, None]).sum(axis = 2)
+        scores = distances[cat_ids[:, None], destinations] + manhattan / (2 * manhattan.max() + 1)
+
+    return np.where(valid, scores, -np.inf), valid
+
+def build_dataset(lab_map, role, soft_labels = False, noise = 0, seed = None):
+    """
+    Set de datos completo para un rol: X tiene (cat_x, cat_y, mouse_x, mouse_y) para cada par de casillas libres
+    e y el movimiento elegido en formato one-hot. Con soft_labels, la probabilidad se reparte entre todos los
+    movimientos empatados como mejores, y con noise una fracción de las etiquetas se cambia por un movimiento
+    válido aleatorio
+    """
+
+    if role not in ROLES:
+        raise ValueError(f"Rol desconocido: {role} (disponibles: {', '.join(ROLES)})")
+
+    context = MapContext(lab_map)
+    cat_positions, mouse_positions = context.encoder.decode(np.arange(context.encoder.n_states))
+    X = np.concatenate([cat_positions, mouse_positions], axis = 1)
+
+    scores, valid = move_scores(context, role)
+    best = scores == scores.max(axis = 1, keepdims = True)
+
+    if soft_labels:
+        y = best / best.sum(axis = 1, keepdims = True)
+    else:
+        # Entre movimientos empatados se elige el primero en el orden de bfs_search (igual que BaseCat)
+        order = np.array(BFS_MOVE_ORDER + (4,))
+        y = np.zeros(scores.shape)
+        y[np.arange(len(y)), order[np.argmax(best[:, order], axis = 1)]] = 1
+
+    # Etiquetas ruidosas: un movimiento válido elegido al azar
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        noisy = np.flatnonzero(rng.random(len(y)) < noise)
+        random_moves = np.argmax(valid[noisy] * rng.random((len(noisy), len(MOVES))), axis = 1)
+        y[noisy] = 0
+        y[noisy, random_moves] = 1
+
+    return X, y
+
+def load_dataset(lab_map, role, soft_labels = False, noise = 0, seed = None):
+    """
+    Igual a build_dataset, pero guarda el resultado en dataset_cache/ y lo reutiliza si ya existe
+    (los sets con ruido solo se guardan si se entrega una semilla, ya que si no cambian en cada llamada)
+    """
+
+    if noise > 0 and seed is None:
+        return build_dataset(lab_map, role, soft_labels, noise, seed)
+
+    name = f"{map_hash(lab_map)}_{role}_soft{int(soft_labels)}_noise{noise}_seed{seed}.npz"
+    path = os.path.join(CACHE_PATH, name)
+    if os.path.exists(path):
+        data = np.load(path)
+        return data["X"], data["y"]
+
+    X, y = build_dataset(lab_map, role, soft_labels, noise, seed)
+    os.makedirs(CACHE_PATH, exist_ok = True)
+    np.savez(path, X = X, y = y)
+    return X, y
@@ -0,0 +1,144 @@
+import multiprocessing
+import random
+import os
+
+import numpy as np
+
+from chase_game import ChaseGame
+from agents.registry import make_agent
+from stats import EpisodeStats, StatsWriter
+
+# Número de partidas a jugar
+NUM_EPISODES = 100000
+
+# Partidas por bloque, cada bloque es reportado como una línea (igual que en test.py)
+BLOCK_SIZE = 100
+
+# Número de procesos a utilizar (None utiliza todos los núcleos disponibles)
+NUM_PROCESSES = None
+
+# Semilla base, a partir de ella se deriva la semilla de cada bloque de partidas
+SEED = 0
+
+# Ruido en las acciones de los agentes durante la evaluación
+NOISE = 0.01
+
+# Agentes a evaluar, como (nombre en agents.registry, archivo de la Q-Table o red)
+CAT_SPEC = ("base_cat",)
+MOUSE_SPEC = ("rl_mouse", "QTableMouse1000.npy")
+
+# Estado de cada proceso trabajador, creado una sola vez por proceso
+_worker = {}
+
+def seed_all(seed, *keys):
+    """ Fija las semillas de random y np.random a partir de la semilla base y las claves entregadas """
+
+    seed_sequence = np.random.SeedSequence([seed, *keys])
+    random.seed(int(seed_sequence.generate_state(1)[0]))
+    np.random.seed(seed_sequence.generate_state(1)[0])
+
+def build_agent(spec, position):
+    """ Crea un agente a partir de su especificación (nombre en agents.registry, archivo opcional) """
+
+    name, *table = spec
+    table = table[0] if table else None
+
+    # Las Q-Tables se leen con mmap, así todos los procesos comparten la misma copia en memoria
+    # (las exportadas con agents.reinforced.export_table ocupan entre 2 y 40 veces menos)
+    if name in ("rl_cat", "rl_mouse"):
+        return make_agent(name, position, table = table, mmap_mode = "r")
+    return make_agent(name, position, table = table)
+
+def init_worker(cat_spec, mouse_spec, noise):
+    """ Inicializa el juego y los agentes de un proceso trabajador """
+
+    game = ChaseGame(visualization = False)
+    _worker["game"] = game
+    _worker["cat"] = build_agent(cat_spec, game.cat_pos)
+    _worker["mouse"] = build_agent(mouse_spec, game.mouse_pos)
+    _worker["noise"] = noise
+
+def play_games(game, cat, mouse, n_games, noise = 0, train = False, first_game = 1, stats = None):
+    """
+    Juega n_games partidas seguidas y retorna la duración de cada una. Al entrenar, las partidas se numeran
+    desde first_game para actualizar la tasa de exploración de los agentes. Si se entrega stats (EpisodeStats),
+    también se agrega cada partida, indicando si terminó en captura
+    """
+
+    steps = np.zeros(n_games, dtype=np.int64)
+    for n_game in range(n_games):
+        game.reset()
+
+        # Mientras la partida no ha acabado
+        while not game.end:
+            old_cat_pos = game.cat_pos.copy()
+            old_mouse_pos = game.mouse_pos.copy()
+
+            # Obtenemos la acción de cada agente y jugamos el movimiento
+            cat_action = cat.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = noise, train = train)
+            mouse_action = mouse.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = noise, train = train)
+            game.game_step(cat_action, mouse_action)
+
+            # Actualizamos las posiciones de cada agente
+            cat.pos = game.cat_pos
+            mouse.pos = game.mouse_pos
+
+            # Solo al entrenar se actualiza la política de comportamiento
+            if train:
+                cat.update_policy(game.lab_map, cat_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
+                mouse.update_policy(game.lab_map, mouse_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
+
+        # Al entrenar, también se actualiza la tasa de exploración (igual que en train_reinforced_agent.py)
+        if train:
+            cat.update_exploration(first_game + n_game)
+            mouse.update_exploration(first_game + n_game)
+
+        steps[n_game] = game.t
+        if stats is not None:
+            stats.add(game.t, captured = bool((game.cat_pos == game.mouse_pos).all()))
+    return steps
+
+def play_block(task):
+    """ Juega un bloque de partidas con su propia semilla y retorna sus estadísticas (EpisodeStats) """
+
+    block_index, n_games, seed = task
+
+    # Cada bloque tiene su semilla, así el resultado no depende de qué proceso lo juegue
+    seed_all(seed, block_index)
+
+    stats = EpisodeStats()
+    play_games(_worker["game"], _worker["cat"], _worker["mouse"], n_games, noise = _worker["noise"], stats = stats)
+    return block_index, stats
+
+def evaluate(cat_spec, mouse_spec, num_episodes = NUM_EPISODES, processes = NUM_PROCESSES, seed = SEED, noise = NOISE, verbose = True,
+             stats_log = None):
+    """
+    Evalúa un par de agentes repartiendo las partidas en bloques entre varios procesos y retorna las estadísticas
+    de todas las partidas (EpisodeStats). Con stats_log, las de cada bloque se guardan en stats/stats_log
+    """
+
+    tasks = [(index, min(BLOCK_SIZE, num_episodes - start), seed) for index, start in enumerate(range(0, num_episodes, BLOCK_SIZE))]
+    processes = processes or os.cpu_count()
+
+    with multiprocessing.Pool(processes, initializer = init_worker, initargs = (cat_spec, mouse_spec, noise)) as pool:
+        # Los bloques llegan en orden, así los reportes son iguales sin importar el número de procesos
+        total_stats = EpisodeStats()
+        stats_writer = StatsWriter(stats_log) if stats_log is not None else None
+        for block_index, stats in pool.imap(play_block, tasks):
+            n_game = block_index * BLOCK_SIZE + stats.count
+            if stats_writer is not None:
+                stats_writer.write({"game": n_game, **stats.summary()})
+            if verbose:
+                period_steps = round(stats.mean * stats.count)
+                print('Game', n_game, '| Mean Steps:', period_steps // stats.count, '| MAX:', stats.max, "| MIN:", stats.min, "| Total Steps:", period_steps)
+            total_stats.merge(stats)
+
+    if stats_writer is not None:
+        stats_writer.close()
+    if verbose:
+        print('Mean Steps:', total_stats.mean, '| MAX:', total_stats.max, '| MIN:', total_stats.min)
+        print("Total |", total_stats.line())
+    return total_stats
+
+if __name__ == "__main__":
+    evaluate(CAT_SPEC, MOUSE_SPEC)
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+
+# Path desde donde se generan los mapas, se guardan en maps/ (se cargan con ChaseGame(map_path = ...))
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+MAPS_PATH = os.path.join(CURRENT_PATH, "maps")
+
+# Efecto de los movimientos entre casillas vecinas
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+def generate_maze(rows, cols, loop_density = 0.1, seed = None):
+    """
+    Laberinto de rows x cols (1 = pared, 0 = libre) con pasillos de una casilla, generado con una búsqueda en
+    profundidad aleatoria. loop_density es la fracción de paredes entre pasillos que se abren para formar ciclos
+    (sin ciclos el ratón no tiene por dónde escapar)
+    """
+
+    rng = np.random.default_rng(seed)
+    lab_map = np.ones((rows, cols))
+
+    # Los pasillos están en las casillas con ambas coordenadas pares, las paredes entre ellos en las demás
+    cell_rows, cell_cols = (rows + 1) // 2, (cols + 1) // 2
+    visited = np.zeros((cell_rows, cell_cols), dtype = bool)
+
+    start = (int(rng.integers(cell_rows)), int(rng.integers(cell_cols)))
+    visited[start] = True
+    lab_map[2 * start[0], 2 * start[1]] = 0
+    stack = [start]
+    while stack:
+        i, j = stack[-1]
+        options = [(i + di, j + dj) for di, dj in DIRECTIONS
+                   if 0 <= i + di < cell_rows and 0 <= j + dj < cell_cols and not visited[i + di, j + dj]]
+        if not options:
+            stack.pop()
+            continue
+
+        # Avanzamos a un vecino sin visitar al azar, abriendo la pared entre ambos
+        next_i, next_j = options[rng.integers(len(options))]
+        visited[next_i, next_j] = True
+        lab_map[2 * next_i, 2 * next_j] = 0
+        lab_map[i + next_i, j + next_j] = 0
+        stack.append((next_i, next_j))
+
+    # Abrimos algunas paredes entre dos pasillos (casillas con una sola coordenada impar)
+    if loop_density > 0:
+        x, y = np.nonzero(lab_map == 1)
+        between = ((x % 2 == 1) & (y % 2 == 0) & (x + 1 < rows)) | ((x % 2 == 0) & (y % 2 == 1) & (y + 1 < cols))
+        x, y = x[between], y[between]
+        opened = rng.random(len(x)) < loop_density
+        lab_map[x[opened], y[opened]] = 0
+
+    return lab_map
+
+def generate_rooms(rows, cols, room_size = 8, obstacle_density = 0.0, seed = None):
+    """
+    Mapa de rows x cols dividido en habitaciones de a lo más room_size casillas por lado, conectadas por puertas
+    (división recursiva). obstacle_density es la fracción de casillas interiores que se cambian por obstáculos sueltos
+    """
+
+    rng = np.random.default_rng(seed)
+    lab_map = np.zeros((rows, cols))
+
+    # Cada región se divide con una pared en una posición impar y una puerta en una posición par
+    # (relativas a la región, que siempre comienza en posiciones pares), así una pared nunca tapa una puerta
+    regions = [(0, 0, rows, cols)]
+    while regions:
+        row, col, height, width = regions.pop()
+        if height <= room_size and width <= room_size:
+            continue
+
+        if height >= width and height >= 3:
+            wall = row + 2 * int(rng.integers((height - 1) // 2)) + 1
+            door = col + 2 * int(rng.integers((width + 1) // 2))
+            lab_map[wall, col:col + width] = 1
+            lab_map[wall, door] = 0
+            regions += [(row, col, wall - row, width), (wall + 1, col, row + height - wall - 1, width)]
+        elif width >= 3:
+            wall = col + 2 * int(rng.integers((width - 1) // 2)) + 1
+            door = row + 2 * int(rng.integers((height + 1) // 2))
+            lab_map[row:row + height, wall] = 1
+            lab_map[door, wall] = 0
+            regions += [(row, col, height, wall - col), (row, wall + 1, height, col + width - wall - 1)]
+
+    # Los obstáculos solo se ponen en casillas con ambas coordenadas impares: nunca son puertas ni pasillos de una
+    # casilla, y siempre se pueden rodear por la esquina (par, par), así el mapa sigue conectado
+    if obstacle_density > 0:
+        candidates = np.argwhere((lab_map == 0) & (np.arange(rows)[:, None] % 2 == 1) & (np.arange(cols) % 2 == 1))
+        obstacles = candidates[rng.random(len(candidates)) < obstacle_density]
+        lab_map[obstacles[:, 0], obstacles[:, 1]] = 1
+
+    return lab_map
+
+def save_map(lab_map, name):
+    """ Guarda el mapa en maps/name y retorna su path """
+
+    os.makedirs(MAPS_PATH, exist_ok = True)
+    path = os.path.join(MAPS_PATH, name)
+    np.save(path, lab_map)
+    return path
+
+if __name__ == "__main__":
+    # Algunos mapas de ejemplo, reproducibles gracias a la semilla
+    for name, lab_map in (
+        ("maze_101x101.npy", generate_maze(101, 101, loop_density = 0.1, seed = 0)),
+        ("rooms_100x150.npy", generate_rooms(100, 150, room_size = 10, obstacle_density = 0.05, seed = 0)),
+        ("maze_501x501.npy", generate_maze(501, 501, loop_density = 0.1, seed = 0)),
+    ):
+        path = save_map(lab_map, name)
+        print(f"{os.path.relpath(path, CURRENT_PATH)} | {lab_map.shape[0]}x{lab_map.shape[1]} | Casillas libres: {np.count_nonzero(lab_map == 0)}")
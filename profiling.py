@@ -0,0 +1,77 @@
+import cProfile
+import time
+import os
+
+# Path desde donde se ejecuta el proyecto, los perfiles de cProfile se guardan en profiles/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+PROFILES_PATH = os.path.join(CURRENT_PATH, "profiles")
+
+class PhaseTimer:
+    """
+    Tiempos acumulados y número de llamadas de cada fase de un ciclo (get_action/cat, game_step, ...).
+    Las fases se miden encadenando tic y toc: start = timer.tic(), fase, start = timer.toc("fase", start), ...
+    Con enabled = False, tic y toc no miden nada, así el ciclo instrumentado corre casi igual de rápido
+    """
+
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.totals = {}
+        self.counts = {}
+
+        # Tiempo total desde el último resumen, para saber qué fracción cubren las fases medidas
+        self.period_start = time.perf_counter()
+
+    def tic(self):
+        """ Marca el inicio de una fase """
+        return time.perf_counter() if self.enabled else 0.0
+
+    def toc(self, name, start):
+        """ Suma el tiempo desde start a la fase name y retorna el instante actual (el inicio de la fase siguiente) """
+
+        if not self.enabled:
+            return 0.0
+
+        now = time.perf_counter()
+        self.totals[name] = self.totals.get(name, 0.0) + now - start
+        self.counts[name] = self.counts.get(name, 0) + 1
+        return now
+
+    def summary(self, reset = True):
+        """ Línea con el porcentaje del tiempo y los microsegundos por llamada de cada fase, de mayor a menor """
+
+        if not self.enabled:
+            return ""
+
+        elapsed = time.perf_counter() - self.period_start
+        phases = sorted(self.totals, key = self.totals.get, reverse = True)
+        parts = [f"{name}: {100 * self.totals[name] / elapsed:.1f}% {1e6 * self.totals[name] / self.counts[name]:.1f} us" for name in phases]
+        measured = 100 * sum(self.totals.values()) / elapsed if elapsed > 0 else 0
+        line = "Profile | " + " | ".join(parts) + f" | Other: {100 - measured:.1f}%"
+
+        if reset:
+            self.reset()
+        return line
+
+    def reset(self):
+        self.totals = {}
+        self.counts = {}
+        self.period_start = time.perf_counter()
+
+def start_cprofile():
+    """ Comienza a perfilar con cProfile todo lo que se ejecute hasta dump_cprofile """
+
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def dump_cprofile(profile, name):
+    """
+    Detiene el perfil y lo guarda en profiles/name, en el formato de pstats
+    (se puede ver con python -m pstats, snakeviz o convertir a flamegraph con flameprof)
+    """
+
+    profile.disable()
+    os.makedirs(PROFILES_PATH, exist_ok = True)
+    path = os.path.join(PROFILES_PATH, name)
+    profile.dump_stats(path)
+    return path
@@ -0,0 +1,164 @@
+import time
+import os
+
+import numpy as np
+
+from chase_game import MapRenderer, load_pygame, MAX_STEPS, TIME_DELAY, WIDTH, HEIGHT
+from utils import get_legal_moves
+
+# Path desde donde se accede al juego, las grabaciones se guardan en recordings/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+RECORDINGS_PATH = os.path.join(CURRENT_PATH, "recordings")
+
+# Pasos por archivo de grabación (cada paso ocupa un byte)
+CHUNK_STEPS = 1 << 24
+
+# Cada paso se guarda como un byte con ambas acciones (gato en los 4 bits altos, ratón en los bajos). Las posiciones
+# no se guardan: el juego es determinista, así que se reconstruyen desde las iniciales de cada partida
+ACTION_BITS = 4
+
+# Cada partida tiene una fila del índice: (archivo, inicio, largo, gato x, gato y, ratón x, ratón y)
+INDEX_COLUMNS = 7
+
+# Cada cuántas partidas se agregan al índice en disco las filas nuevas
+INDEX_FLUSH = 1000
+
+def chunk_path(directory, chunk):
+    return os.path.join(directory, f"chunk{chunk:05d}.bin")
+
+class EpisodeRecorder:
+    """
+    Graba las acciones de cada partida (un byte por paso) en archivos de tamaño fijo mapeados en memoria, junto con
+    un índice (archivo, inicio, largo y posiciones iniciales) por partida para poder acceder a cualquiera de ellas
+    sin leer las anteriores. El mapa se guarda junto a la grabación, para reconstruir las posiciones al reproducirla
+    """
+
+    def __init__(self, directory, lab_map, chunk_steps = CHUNK_STEPS):
+        self.directory = directory
+        self.chunk_steps = chunk_steps
+        os.makedirs(directory, exist_ok = True)
+        np.save(os.path.join(directory, "map.npy"), lab_map)
+
+        # Acciones y posiciones iniciales de la partida en curso (una partida nunca se divide entre dos archivos)
+        self.episode = np.zeros(MAX_STEPS, dtype = np.uint8)
+        self.episode_steps = 0
+        self.start = None
+
+        # Filas del índice aún no escritas, el archivo index.bin solo crece
+        self.index = []
+        self.n_episodes = 0
+        open(os.path.join(directory, "index.bin"), "wb").close()
+
+        self.chunk = -1
+        self.position = chunk_steps
+        self.memmap = None
+
+    def record_step(self, cat_pos, mouse_pos, cat_action, mouse_action):
+        """ Guarda las acciones que jugó cada agente (y, en el primer paso, las posiciones iniciales de la partida) """
+        if self.episode_steps == 0:
+            self.start = (int(cat_pos[0]), int(cat_pos[1]), int(mouse_pos[0]), int(mouse_pos[1]))
+        self.episode[self.episode_steps] = (int(cat_action) << ACTION_BITS) | int(mouse_action)
+        self.episode_steps += 1
+
+    def end_episode(self):
+        """ Cierra la partida en curso y copia sus acciones al archivo de grabación """
+
+        # Si la partida no cabe en el archivo actual, comenzamos uno nuevo
+        length = self.episode_steps
+        if self.position + length > self.chunk_steps:
+            self.open_chunk(self.chunk + 1)
+
+        self.memmap[self.position:self.position + length] = self.episode[:length]
+        self.index.append((self.chunk, self.position, length, *self.start))
+        self.position += length
+        self.episode_steps = 0
+        self.n_episodes += 1
+
+        if self.n_episodes % INDEX_FLUSH == 0:
+            self.flush()
+
+    def open_chunk(self, chunk):
+        self.close_chunk()
+        self.chunk = chunk
+        self.position = 0
+        self.memmap = np.memmap(chunk_path(self.directory, chunk), dtype = np.uint8, mode = "w+", shape = (self.chunk_steps,))
+
+    def close_chunk(self):
+        """ Cierra el archivo actual, recortándolo a los pasos realmente grabados """
+        if self.memmap is not None:
+            self.memmap.flush()
+            self.memmap = None
+            os.truncate(chunk_path(self.directory, self.chunk), self.position)
+
+    def flush(self):
+        if self.memmap is not None:
+            self.memmap.flush()
+        with open(os.path.join(self.directory, "index.bin"), "ab") as file:
+            np.array(self.index, dtype = np.int32).reshape(-1, INDEX_COLUMNS).tofile(file)
+        self.index = []
+
+    def close(self):
+        self.flush()
+        self.close_chunk()
+
+class EpisodeReplay:
+    """
+    Lectura de partidas grabadas con EpisodeRecorder, sin cargar ni recorrer los archivos completos.
+    Las posiciones de cada paso se reconstruyen jugando las acciones grabadas con las reglas de ChaseGame
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = np.fromfile(os.path.join(directory, "index.bin"), dtype = np.int32).reshape(-1, INDEX_COLUMNS)
+        self.lab_map = np.load(os.path.join(directory, "map.npy"))
+        self.legal_moves = get_legal_moves(self.lab_map)
+        self.chunks = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def episode(self, k):
+        """ Acciones (un byte por paso, ver ACTION_BITS) de la partida k """
+
+        chunk, start, length = self.index[k, :3]
+        if chunk not in self.chunks:
+            self.chunks[chunk] = np.memmap(chunk_path(self.directory, chunk), dtype = np.uint8, mode = "r")
+        return self.chunks[chunk][start:start + length]
+
+    def trajectory(self, k):
+        """ Posiciones del gato y el ratón (pasos + 1) y acciones de cada agente (pasos) en la partida k """
+
+        actions = self.episode(k)
+        cat_actions = (actions >> ACTION_BITS).astype(np.int64)
+        mouse_actions = (actions & ((1 << ACTION_BITS) - 1)).astype(np.int64)
+
+        cat_positions = np.empty((len(actions) + 1, 2), dtype = np.int64)
+        mouse_positions = np.empty((len(actions) + 1, 2), dtype = np.int64)
+        cat_positions[0] = self.index[k, 3:5]
+        mouse_positions[0] = self.index[k, 5:7]
+        for step in range(len(actions)):
+            # Mismas reglas que ChaseGame.game_step: los movimientos ilegales dejan al agente en su lugar,
+            # y si pasan uno sobre otro el gato queda sobre el ratón
+            cat = self.legal_moves.move(cat_positions[step], cat_actions[step])
+            mouse = self.legal_moves.move(mouse_positions[step], mouse_actions[step])
+            if (cat == mouse_positions[step]).all() and (mouse == cat_positions[step]).all():
+                cat = mouse
+            cat_positions[step + 1] = cat
+            mouse_positions[step + 1] = mouse
+        return cat_positions, mouse_positions, cat_actions, mouse_actions
+
+    def show(self, k, lab_map = None, delay = TIME_DELAY):
+        """ Reproduce la partida k en una ventana de pygame (por defecto, sobre el mapa guardado con la grabación) """
+
+        pygame = load_pygame()
+        pygame.init()
+        win = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption(f"Cat and Mouse Game | Partida {k}")
+        renderer = MapRenderer(self.lab_map if lab_map is None else lab_map, win)
+
+        cat_positions, mouse_positions, _, _ = self.trajectory(k)
+        for step in range(len(cat_positions)):
+            pygame.event.pump()
+            end = step == len(cat_positions) - 1 and (cat_positions[step] == mouse_positions[step]).all()
+            pygame.display.update(renderer.draw(cat_positions[step], mouse_positions[step], end))
+            time.sleep(delay)
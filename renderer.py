@@ -0,0 +1,85 @@
+import threading
+import queue
+import os
+
+import numpy as np
+
+from chase_game import MapRenderer, load_pygame, WIDTH, HEIGHT
+
+# Cuadros por segundo que dibuja la vista en vivo
+RENDER_FPS = 30
+
+# Estados pendientes de dibujar, si la vista se atrasa se descartan los más antiguos
+QUEUE_SIZE = 8
+
+class RendererThread(threading.Thread):
+    """
+    Vista en vivo que dibuja el juego en su propio hilo a partir de copias del estado, así la simulación
+    corre a máxima velocidad y nunca espera a la pantalla. Solo se muestra una de cada sample_every partidas
+    """
+
+    def __init__(self, lab_map, fps = RENDER_FPS, queue_size = QUEUE_SIZE, sample_every = 1, offscreen = False):
+        super().__init__(daemon = True)
+        self.lab_map = lab_map
+        self.fps = fps
+        self.sample_every = sample_every
+        self.offscreen = offscreen
+
+        self.snapshots = queue.Queue(maxsize = queue_size)
+        self.stop_event = threading.Event()
+
+        # Métricas de la vista
+        self.drawn_frames = 0
+        self.dropped_frames = 0
+
+    def submit(self, game_index, cat_pos, mouse_pos, end):
+        """ Encola una copia del estado de la partida game_index, sin bloquear a la simulación """
+
+        if game_index % self.sample_every != 0:
+            return
+
+        snapshot = (np.array(cat_pos), np.array(mouse_pos), end)
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                # Descartamos el estado más antiguo para mostrar siempre el más reciente
+                try:
+                    self.snapshots.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        if self.offscreen:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+        pygame = load_pygame()
+        pygame.init()
+        win = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Cat and Mouse Game")
+        renderer = MapRenderer(self.lab_map, win)
+        clock = pygame.time.Clock()
+
+        while not self.stop_event.is_set():
+            # Mantenemos la ventana respondiendo aunque no lleguen estados nuevos
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.stop_event.set()
+
+            try:
+                cat_pos, mouse_pos, end = self.snapshots.get(timeout = 1 / self.fps)
+            except queue.Empty:
+                continue
+
+            pygame.display.update(renderer.draw(cat_pos, mouse_pos, end))
+            self.drawn_frames += 1
+
+            # Limitamos los cuadros por segundo
+            clock.tick(self.fps)
+
+        pygame.display.quit()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
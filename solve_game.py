@@ -0,0 +1,97 @@
+import numpy as np
+import time
+import os
+
+from chase_game import CURRENT_PATH, MAX_STEPS
+from utils import get_map_context
+
+# Archivos donde se guardan las Q-Tables resueltas (en agents/data, con el mismo formato que las entrenadas)
+CAT_TABLE_NAME = "QTableCatSolved.npy"
+MOUSE_TABLE_NAME = "QTableMouseSolved.npy"
+
+def build_transitions(context):
+    """
+    Modelo de transición completo del juego: para cada estado y cada par de movimientos (gato, ratón)
+    retorna la fila del estado siguiente y si la partida termina, con las mismas reglas que ChaseGame
+    """
+
+    n_free = context.encoder.n_free
+    cat_ids, mouse_ids = np.divmod(np.arange(context.encoder.n_states), n_free)
+
+    # Casilla de destino de cada agente, los movimientos inválidos dejan al agente en su lugar
+    new_cat_ids = context.move_table[cat_ids][:, :, None]
+    new_mouse_ids = context.move_table[mouse_ids][:, None, :]
+
+    # La partida termina si quedan en la misma casilla o si pasan uno sobre otro
+    caught = new_cat_ids == new_mouse_ids
+    swapped = (new_cat_ids == mouse_ids[:, None, None]) & (new_mouse_ids == cat_ids[:, None, None])
+    terminal = caught | swapped
+
+    next_rows = new_cat_ids * n_free + new_mouse_ids
+    return next_rows, terminal, cat_ids == mouse_ids
+
+def value_iteration(next_rows, terminal, finished, cat_first, max_steps = MAX_STEPS):
+    """
+    Iteración de valor sobre el espacio de estados completo. El valor de un estado es el número de pasos hasta
+    la captura (como máximo max_steps), con el gato minimizando y el ratón maximizando. Si cat_first es True el
+    gato elige suponiendo que el ratón responde a su movimiento (min max), si no, al revés (max min)
+    """
+
+    values = np.zeros(len(next_rows))
+    iterations = 0
+    while True:
+        iterations += 1
+
+        # Pasos hasta la captura para cada par de movimientos (gato, ratón)
+        joint_values = 1 + np.where(terminal, 0, values[next_rows])
+
+        if cat_first:
+            new_values = np.min(np.max(joint_values, axis = 2), axis = 1)
+        else:
+            new_values = np.max(np.min(joint_values, axis = 1), axis = 1)
+        new_values = np.minimum(new_values, max_steps)
+        new_values[finished] = 0
+
+        if np.array_equal(new_values, values):
+            return values, joint_values, iterations
+        values = new_values
+
+def solve(context, max_steps = MAX_STEPS):
+    """
+    Resuelve el juego y retorna los valores (pasos hasta la captura) y las Q-Tables de ambos agentes.
+    Cada agente juega su estrategia minimax pura, suponiendo que el rival responde de la mejor forma
+    """
+
+    next_rows, terminal, finished = build_transitions(context)
+
+    cat_values, cat_joint_values, cat_iterations = value_iteration(next_rows, terminal, finished, True, max_steps)
+    mouse_values, mouse_joint_values, mouse_iterations = value_iteration(next_rows, terminal, finished, False, max_steps)
+
+    # Cuando hay empate en el valor minimax (por ejemplo, si el ratón puede escapar para siempre) se desempata por
+    # la distancia tras el movimiento, escalada para no superar un paso: el gato considera la distancia promedio
+    # sobre las respuestas del ratón y el ratón la menor distancia que el gato le puede dejar
+    distances = context.oracle.distances
+    new_cat_ids, new_mouse_ids = np.divmod(next_rows, context.encoder.n_free)
+    tie_break = np.where(terminal, 0, distances[new_cat_ids, new_mouse_ids]) / (distances.max() + 1)
+
+    # Las Q-Tables se eligen con argmax: el gato prefiere menos pasos y el ratón más pasos
+    cat_q_table = -np.max(cat_joint_values, axis = 2) - np.mean(tie_break, axis = 2)
+    mouse_q_table = np.min(mouse_joint_values + tie_break, axis = 1)
+
+    return cat_values, mouse_values, cat_q_table, mouse_q_table, cat_iterations + mouse_iterations
+
+if __name__ == "__main__":
+    context = get_map_context(os.path.join(CURRENT_PATH, "game_map.npy"))
+
+    start = time.time()
+    cat_values, mouse_values, cat_q_table, mouse_q_table, iterations = solve(context)
+    print(f"Resuelto en {iterations} iteraciones ({time.time() - start:.2f} s)")
+
+    # Duración óptima desde los estados con ratón y gato separados, según cada agente
+    playing = cat_values > 0
+    for name, values in (("Gato", cat_values), ("Ratón", mouse_values)):
+        print(f"{name} | Pasos hasta la captura | Media: {values[playing].mean():.2f} | MIN: {values[playing].min():.0f} | Estados sin captura: {np.count_nonzero(values >= MAX_STEPS)}")
+
+    np.save(os.path.join(CURRENT_PATH, "agents", "data", CAT_TABLE_NAME), cat_q_table)
+    np.save(os.path.join(CURRENT_PATH, "agents", "data", MOUSE_TABLE_NAME), mouse_q_table)
+    print(f"Guardando Q-Tables en agents/data/{CAT_TABLE_NAME} y agents/data/{MOUSE_TABLE_NAME}")
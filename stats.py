@@ -0,0 +1,179 @@
+import json
+import csv
+import os
+
+import numpy as np
+
+from chase_game import MAX_STEPS
+
+# Path desde donde se ejecuta el proyecto, los registros de estadísticas se guardan en stats/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+STATS_PATH = os.path.join(CURRENT_PATH, "stats")
+
+# Cuantiles de la duración de las partidas incluidos en cada resumen
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+class EpisodeStats:
+    """
+    Estadísticas de la duración de las partidas en memoria constante: media y varianza en línea (Welford),
+    un histograma con un casillero por cada duración posible (0 a max_steps) y el número de capturas y de
+    partidas que acabaron por tiempo. Las de distintos procesos se combinan con merge
+    """
+
+    def __init__(self, max_steps = MAX_STEPS):
+        self.max_steps = max_steps
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = np.zeros(self.max_steps + 1, dtype=np.int64)
+        self.captures = 0
+        self.timeouts = 0
+
+    def add(self, steps, captured = None):
+        """
+        Agrega una partida de steps pasos. Si no se indica captured, se considera capturado al ratón
+        en toda partida que terminó antes de max_steps
+        """
+
+        steps = int(steps)
+        if captured is None:
+            captured = steps < self.max_steps
+
+        # Actualización de Welford de la media y la suma de cuadrados de las diferencias
+        self.count += 1
+        delta = steps - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (steps - self.mean)
+
+        self.min = steps if self.min is None else min(self.min, steps)
+        self.max = steps if self.max is None else max(self.max, steps)
+        self.histogram[min(steps, self.max_steps)] += 1
+        if captured:
+            self.captures += 1
+        else:
+            self.timeouts += 1
+
+    def add_many(self, steps, captured = None):
+        """ Igual que add, para un array de duraciones (y opcionalmente uno de capturas) """
+
+        steps = np.asarray(steps, dtype=np.int64)
+        if len(steps) == 0:
+            return
+        if captured is None:
+            captured = steps < self.max_steps
+
+        batch = EpisodeStats(self.max_steps)
+        batch.count = len(steps)
+        batch.mean = float(steps.mean())
+        batch.m2 = float(np.sum((steps - batch.mean) ** 2))
+        batch.min = int(steps.min())
+        batch.max = int(steps.max())
+        batch.histogram = np.bincount(np.minimum(steps, self.max_steps), minlength = self.max_steps + 1)
+        batch.captures = int(np.count_nonzero(captured))
+        batch.timeouts = batch.count - batch.captures
+        self.merge(batch)
+
+    def merge(self, other):
+        """ Agrega las partidas de other (por ejemplo, las de otro proceso) a estas estadísticas """
+
+        if other.max_steps != self.max_steps:
+            raise ValueError(f"No se pueden combinar estadísticas con distinto max_steps: {self.max_steps} y {other.max_steps}")
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.mean, self.m2, self.min, self.max = other.mean, other.m2, other.min, other.max
+        else:
+            # Combinación de Chan et al. de dos medias y sumas de cuadrados
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+        self.count += other.count
+        self.histogram += other.histogram
+        self.captures += other.captures
+        self.timeouts += other.timeouts
+        return self
+
+    @property
+    def variance(self):
+        """ Varianza muestral de la duración de las partidas """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    def quantile(self, q):
+        """ Menor duración d tal que al menos una fracción q de las partidas duró d pasos o menos """
+
+        if self.count == 0:
+            return None
+        cumulative = np.cumsum(self.histogram)
+        return int(np.searchsorted(cumulative, q * self.count))
+
+    def summary(self):
+        """ Diccionario con las estadísticas, listo para escribirse como JSON o una fila de CSV """
+
+        summary = {
+            "games": self.count,
+            "mean_steps": self.mean,
+            "std_steps": self.std,
+            "min_steps": self.min,
+            "max_steps": self.max,
+            "captures": self.captures,
+            "timeouts": self.timeouts,
+            "capture_rate": self.captures / self.count if self.count else None,
+        }
+        for q in QUANTILES:
+            summary[f"p{round(100 * q)}"] = self.quantile(q)
+        return summary
+
+    def line(self):
+        """ Resumen en una línea, con el formato de los reportes de test.py """
+
+        parts = [f"p{round(100 * q)}: {self.quantile(q)}" for q in QUANTILES]
+        return (f"Mean Steps: {self.mean:.1f} ± {self.std:.1f} | " + " | ".join(parts) +
+                f" | Captures: {self.captures} | Timeouts: {self.timeouts}")
+
+class StatsWriter:
+    """
+    Escribe un registro (diccionario) por línea en stats/name, en JSONL o CSV según la extensión del archivo.
+    Cada registro se escribe en disco de inmediato, así se puede seguir una ejecución larga mientras corre
+    """
+
+    def __init__(self, name):
+        os.makedirs(STATS_PATH, exist_ok = True)
+        self.path = os.path.join(STATS_PATH, name)
+        self.format = "csv" if name.endswith(".csv") else "jsonl"
+        self.file = open(self.path, "w", newline = "")
+        self.writer = None
+
+    def write(self, record):
+        if self.format == "jsonl":
+            self.file.write(json.dumps(record) + "\n")
+        else:
+            # Las columnas del CSV quedan fijas con el primer registro
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.file, fieldnames = list(record))
+                self.writer.writeheader()
+            self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def load_records(path):
+    """ Lee los registros escritos por StatsWriter (JSONL o CSV) como una lista de diccionarios """
+
+    with open(path, newline = "") as file:
+        if path.endswith(".csv"):
+            return list(csv.DictReader(file))
+        return [json.loads(line) for line in file if line.strip()]
@@ -0,0 +1,154 @@
+import multiprocessing
+import itertools
+import time
+import csv
+import os
+
+import numpy as np
+
+from chase_game import ChaseGame
+from evaluation import play_games, seed_all, NOISE
+from agents.registry import make_agent
+
+# Path desde donde se ejecuta el barrido, los resultados se guardan en sweeps/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+SWEEPS_PATH = os.path.join(CURRENT_PATH, "sweeps")
+
+# Agente a entrenar ("cat" o "mouse"), siempre contra el agente base del otro rol
+ROLE = "mouse"
+
+# Tipo de búsqueda: "grid" prueba todas las combinaciones de GRID y "random" sortea NUM_CONFIGS de RANDOM_SPACE
+SEARCH = "random"
+NUM_CONFIGS = 50
+
+# Valores a probar para cada hiperparámetro de RLCat / RLMouse
+GRID = {
+    "alpha": [0.05, 0.1, 0.2, 0.5],
+    "gamma": [0.1, 0.5, 0.9],
+    "exploration_decay_rate": [0.0001, 0.0005, 0.001],
+}
+
+# Rangos de la búsqueda aleatoria: ("uniform", min, max), ("log", min, max) o una lista de opciones
+RANDOM_SPACE = {
+    "alpha": ("log", 0.01, 0.5),
+    "gamma": ("uniform", 0.1, 0.99),
+    "exploration_decay_rate": ("log", 0.0001, 0.005),
+    "min_exploration_rate": [0.0001, 0.01],
+}
+
+# Partidas de entrenamiento y de evaluación de cada configuración
+TRAIN_EPISODES = 5000
+EVAL_EPISODES = 1000
+
+# Número de procesos a utilizar (None utiliza todos los núcleos disponibles)
+NUM_PROCESSES = None
+
+# Semilla base, de ella se derivan la del entrenamiento de cada configuración y la de la evaluación (común a todas)
+SEED = 0
+
+# Si guardar la Q-Table entrenada de cada configuración en sweeps/
+SAVE_TABLES = False
+
+def build_configs(search = SEARCH, grid = GRID, space = RANDOM_SPACE, num_configs = NUM_CONFIGS, seed = SEED):
+    """ Lista de configuraciones (diccionarios de hiperparámetros) a probar """
+
+    if search == "grid":
+        return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+    if search != "random":
+        raise ValueError(f"Búsqueda desconocida: {search} (disponibles: grid, random)")
+
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(num_configs):
+        config = {}
+        for name, spec in space.items():
+            if isinstance(spec, list):
+                config[name] = spec[rng.integers(len(spec))]
+            elif spec[0] == "log":
+                config[name] = float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+            else:
+                config[name] = float(rng.uniform(spec[1], spec[2]))
+        configs.append(config)
+    return configs
+
+def run_config(task):
+    """ Entrena una configuración contra el agente base del otro rol, la evalúa y retorna sus métricas """
+
+    config_index, config, role, train_episodes, eval_episodes, seed = task
+    start = time.perf_counter()
+
+    # Los snapshots de los agentes se desactivan, si no todos los procesos escribirían en agents/data
+    game = ChaseGame(visualization = False)
+    if role == "cat":
+        cat = make_agent("rl_cat", game.cat_pos, save_every = None, **config)
+        mouse = make_agent("base_mouse", game.mouse_pos)
+        agent = cat
+    else:
+        cat = make_agent("base_cat", game.cat_pos)
+        mouse = make_agent("rl_mouse", game.mouse_pos, save_every = None, **config)
+        agent = mouse
+
+    # Entrenamiento, con una semilla distinta para cada configuración
+    seed_all(seed, 0, config_index)
+    train_steps = play_games(game, cat, mouse, train_episodes, train = True)
+    train_time = time.perf_counter() - start
+
+    # Evaluación, con la misma semilla para todas las configuraciones
+    seed_all(seed, 1)
+    eval_start = time.perf_counter()
+    eval_steps = play_games(game, cat, mouse, eval_episodes, noise = NOISE)
+    eval_time = time.perf_counter() - eval_start
+
+    if SAVE_TABLES:
+        np.save(os.path.join(SWEEPS_PATH, f"QTable{role.capitalize()}Config{config_index}.npy"), agent.q_table)
+
+    wall_time = time.perf_counter() - start
+    return {
+        "config": config_index,
+        **config,
+        "mean_steps": eval_steps.mean(),
+        "max_steps": int(eval_steps.max()),
+        "min_steps": int(eval_steps.min()),
+        "train_steps": int(train_steps.sum()),
+        "train_time": train_time,
+        "train_steps_per_s": train_steps.sum() / train_time,
+        "eval_steps_per_s": eval_steps.sum() / eval_time,
+        "wall_time": wall_time,
+    }
+
+def sweep(configs, role = ROLE, train_episodes = TRAIN_EPISODES, eval_episodes = EVAL_EPISODES, processes = NUM_PROCESSES,
+          seed = SEED, output_name = None, verbose = True):
+    """ Prueba todas las configuraciones en paralelo y escribe la tabla de resultados en sweeps/ """
+
+    if role not in ("cat", "mouse"):
+        raise ValueError(f"Rol desconocido: {role} (disponibles: cat, mouse)")
+
+    os.makedirs(SWEEPS_PATH, exist_ok = True)
+    tasks = [(index, config, role, train_episodes, eval_episodes, seed) for index, config in enumerate(configs)]
+    processes = processes or os.cpu_count()
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = []
+        for result in pool.imap_unordered(run_config, tasks):
+            results.append(result)
+            if verbose:
+                print('Config', result["config"], '| Mean Steps:', round(result["mean_steps"], 2), '| Steps/s:', int(result["train_steps_per_s"]), '| Time:', round(result["wall_time"], 1), 's')
+    results.sort(key = lambda result: result["config"])
+
+    output_name = output_name or f"{role}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    with open(os.path.join(SWEEPS_PATH, output_name), "w", newline = "") as file:
+        writer = csv.DictWriter(file, fieldnames = list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+    # El gato busca capturar rápido (menos pasos) y el ratón sobrevivir (más pasos)
+    best = (min if role == "cat" else max)(results, key = lambda result: result["mean_steps"])
+    if verbose:
+        print('Total Time:', round(time.perf_counter() - start, 1), 's | Results:', os.path.join("sweeps", output_name))
+        print('Best Config', best["config"], '| Mean Steps:', round(best["mean_steps"], 2), '|', {name: best[name] for name in configs[0]})
+    return results
+
+if __name__ == "__main__":
+    sweep(build_configs())
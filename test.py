@@ -1,28 +1,64 @@
 import numpy as np
+import os
 from chase_game import ChaseGame
+from recorder import EpisodeRecorder, RECORDINGS_PATH
+from profiling import PhaseTimer, start_cprofile, dump_cprofile
+from stats import EpisodeStats, StatsWriter
+from renderer import RendererThread
 
-from agents.baseline import BaseCat, BaseMouse
-from agents.neural import NNCat, NNMouse
-from agents.reinforced import RLCat, RLMouse
+# Los agentes se crean por nombre, así solo se importa el módulo (y TensorFlow) del agente elegido
+from agents.registry import make_agent
 
 # Si deseamos o no visualización en el juego
 VISUALIZATION = True
 
+# Vista en vivo en otro hilo: la simulación no espera a la pantalla y se muestra una de cada LIVE_VIEW_SAMPLE partidas
+# (usar con VISUALIZATION = False)
+LIVE_VIEW = False
+LIVE_VIEW_SAMPLE = 100
+
+# Si deseamos grabar las partidas (se guardan en recordings/test, ver recorder.EpisodeReplay para verlas)
+RECORD = False
+
+# Si deseamos medir el tiempo de cada fase del ciclo (se reporta junto a las métricas cada 100 partidas)
+PROFILE = False
+
+# Si deseamos guardar un perfil completo de cProfile en profiles/test.prof (ver profiling.dump_cprofile)
+CPROFILE = False
+
+# Archivo en stats/ donde guardar las estadísticas de cada 100 partidas (terminado en .jsonl o .csv, None para no guardarlas)
+STATS_LOG = None
+
 # Número de partidas a jugar
 NUM_EPISODES = 100000
 
 # Instanciamos el juego
 game = ChaseGame(visualization = VISUALIZATION)
+if LIVE_VIEW:
+    game.viewer = RendererThread(game.lab_map, sample_every = LIVE_VIEW_SAMPLE)
+    game.viewer.start()
 
 # Instanciamos los agentes
-cat = BaseCat(game.cat_pos)
-# mouse = BaseMouse(game.mouse_pos)
+cat = make_agent("base_cat", game.cat_pos)
+# mouse = make_agent("base_mouse", game.mouse_pos)
+
+# cat = make_agent("nn_cat", game.cat_pos, table = "NNCat.h5")         # Reemplazar con el nombre del archivo de la red neuronal
+# mouse = make_agent("nn_mouse", game.mouse_pos, table = "NNMouse.h5") # Reemplazar con el nombre del archivo de la red neuronal
+
+# cat = make_agent("rl_cat", game.cat_pos, table = "QTableCat1000.npy", mmap_mode = "r")        # Reemplazar con el nombre del archivo de la Q-Table
+mouse = make_agent("rl_mouse", game.mouse_pos, table = "QTableMouse1000.npy", mmap_mode = "r")  # Reemplazar con el nombre del archivo de la Q-Table
 
-# cat = NNCat(game.cat_pos, "NNCat.h5")         # Reemplazar con el nombre del archivo de la red neuronal
-# mouse = NNMouse(game.mouse_pos, "NNMouse.h5") # Reemplazar con el nombre del archivo de la red neuronal
+# Grabación de las partidas
+recorder = EpisodeRecorder(os.path.join(RECORDINGS_PATH, "test"), game.lab_map) if RECORD else None
 
-# cat = RLCat(game.cat_pos, "QTableCat1000.npy")        # Reemplazar con el nombre del archivo de la Q-Table
-mouse = RLMouse(game.mouse_pos, "QTableMouse1000.npy")  # Reemplazar con el nombre del archivo de la Q-Table
+# Tiempos de cada fase del ciclo (sin PROFILE no se mide nada)
+timer = PhaseTimer(enabled = PROFILE)
+profile = start_cprofile() if CPROFILE else None
+
+# Estadísticas de la duración de las partidas (media, varianza, cuantiles y capturas) de cada periodo y del total
+period_stats = EpisodeStats()
+total_stats = EpisodeStats()
+stats_writer = StatsWriter(STATS_LOG) if STATS_LOG is not None else None
 
 # Métricas de desempeño
 mean_time = 0
@@ -37,25 +73,45 @@ for n_game in range(1, NUM_EPISODES + 1):
     while not game.end:
 
         # Obtenemos la acción de cada agente
+        start = timer.tic()
         cat_action = cat.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = 0.01)
+        start = timer.toc("get_action/cat", start)
         mouse_action = mouse.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = 0.01)
+        timer.toc("get_action/mouse", start)
         
+        # Guardamos el estado y las acciones de este paso
+        if recorder is not None:
+            recorder.record_step(game.cat_pos, game.mouse_pos, cat_action, mouse_action)
+
         # Jugamos el movimiento de cada agente
+        start = timer.tic()
         game.game_step(cat_action, mouse_action)
+        timer.toc("game_step", start)
 
         # Actualizamos las posiciones de cada agente
         cat.pos = game.cat_pos
         mouse.pos = game.mouse_pos
 
+    # Cerramos la grabación de la partida
+    if recorder is not None:
+        recorder.end_episode()
+
     # Cada 100 partidas, reportamos el desempeño
     if n_game % 100 == 0:
         print('Game', n_game, '| Mean Steps:', period_steps//100, '| MAX:', max_time, "| MIN:", min_time, "| Total Steps:", period_steps)
+        if PROFILE:
+            print(timer.summary())
+        if stats_writer is not None:
+            stats_writer.write({"game": n_game, **period_stats.summary()})
+        total_stats.merge(period_stats)
+        period_stats.reset()
         period_steps = 0
         max_time = 0
         min_time = np.inf
 
-    # Métricas específicas de cada periodo
+    # Métricas específicas de cada periodo (el gato captura al ratón si terminan en la misma casilla)
     period_steps += game.t
+    period_stats.add(game.t, captured = bool((game.cat_pos == game.mouse_pos).all()))
     if game.t > max_time:
         max_time = game.t
     if game.t < min_time:
@@ -67,3 +123,17 @@ for n_game in range(1, NUM_EPISODES + 1):
 
     # Si la partida termina, iniciamos una nueva
     game.reset()
+
+# Estadísticas de todas las partidas
+total_stats.merge(period_stats)
+print("Total |", total_stats.line())
+if stats_writer is not None:
+    stats_writer.close()
+
+# Escribimos en disco lo que quede pendiente de la grabación
+if recorder is not None:
+    recorder.close()
+
+# Guardamos el perfil de cProfile
+if profile is not None:
+    print("Perfil guardado en", dump_cprofile(profile, "test.prof"))
@@ -0,0 +1,192 @@
+import multiprocessing
+import importlib.util
+import argparse
+import time
+import glob
+import csv
+import re
+import os
+
+import numpy as np
+
+from chase_game import ChaseGame
+from evaluation import build_agent, play_games, seed_all, NOISE
+from stats import EpisodeStats
+
+# Path desde donde se ejecuta el torneo, las Q-Tables se buscan en agents/data y los resultados se guardan en tournaments/
+CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+DATA_PATH = os.path.join(CURRENT_PATH, "agents", "data")
+TOURNAMENTS_PATH = os.path.join(CURRENT_PATH, "tournaments")
+
+# Partidas por enfrentamiento, repartidas en bloques de BLOCK_SIZE (cada bloque es una tarea para los procesos)
+GAMES_PER_PAIR = 200
+BLOCK_SIZE = 50
+
+# Número de procesos a utilizar (None utiliza todos los núcleos disponibles)
+NUM_PROCESSES = None
+
+# Semilla base: el bloque i de todos los enfrentamientos usa la misma semilla, así todos juegan las mismas posiciones iniciales
+SEED = 0
+
+# Valor z del intervalo de confianza de la media de pasos (1.96 = 95%)
+CONFIDENCE_Z = 1.96
+
+# Snapshots de Q-Tables guardados por los agentes (QTableCat13000.npy, QTableMouse2000.delta.npz, QTableMouse13000Policy.npy, ...)
+CHECKPOINT_PATTERN = re.compile(r"QTable(Cat|Mouse)(\d+)(.*)\.(?:npy|npz)$")
+
+# Estado de cada proceso trabajador: el juego y los agentes ya creados (cada Q-Table se abre una vez por proceso)
+_worker = {}
+
+def find_checkpoints(data_path = DATA_PATH):
+    """ Especificaciones (como en evaluation.build_agent) de todos los snapshots de Q-Tables, por rol """
+
+    checkpoints = {"cat": [], "mouse": []}
+    for path in glob.glob(os.path.join(data_path, "**", "QTable*.np*"), recursive = True):
+        match = CHECKPOINT_PATTERN.match(os.path.basename(path))
+        if match is None:
+            continue
+        role, n_game, suffix = match.groups()
+        table = os.path.relpath(path, data_path)
+        checkpoints[role.lower()].append((os.path.dirname(table), int(n_game), suffix, table))
+
+    # Ordenados por carpeta y número de partida (no alfabéticamente, donde 13000 quedaría antes que 2000)
+    return {role: [(f"rl_{role}", entry[-1]) for entry in sorted(entries)] for role, entries in checkpoints.items()}
+
+def build_entrants(data_path = DATA_PATH, include_base = True, include_nn = True):
+    """ Participantes del torneo de cada rol: los agentes base, las redes guardadas y todos los snapshots """
+
+    checkpoints = find_checkpoints(data_path)
+    entrants = {}
+    for role in ("cat", "mouse"):
+        entrants[role] = [(f"base_{role}",)] if include_base else []
+
+        # Las redes solo participan si existen y TensorFlow está instalado
+        network = f"NN{role.capitalize()}.h5"
+        if include_nn and os.path.exists(os.path.join(data_path, network)) and importlib.util.find_spec("tensorflow") is not None:
+            entrants[role].append((f"nn_{role}", network))
+
+        entrants[role] += checkpoints[role]
+    return entrants
+
+def label(spec):
+    """ Nombre corto de un participante (base_cat, nn_mouse, Test1/QTableCat13000, ...) """
+    return re.sub(r"\.(npy|npz)$", "", spec[1]) if spec[0].startswith("rl_") else spec[0]
+
+def init_worker(noise):
+    _worker["game"] = ChaseGame(visualization = False)
+    _worker["agents"] = {}
+    _worker["noise"] = noise
+
+def get_agent(spec, position):
+    """ Agente de la especificación, creado solo la primera vez que el proceso lo necesita """
+
+    if spec not in _worker["agents"]:
+        _worker["agents"][spec] = build_agent(spec, position)
+    return _worker["agents"][spec]
+
+def play_pairing_block(task):
+    """ Juega un bloque de partidas de un enfrentamiento y retorna sus estadísticas """
+
+    cat_index, mouse_index, cat_spec, mouse_spec, block_index, n_games, seed = task
+    game = _worker["game"]
+    cat = get_agent(cat_spec, game.cat_pos)
+    mouse = get_agent(mouse_spec, game.mouse_pos)
+
+    seed_all(seed, block_index)
+    stats = EpisodeStats()
+    play_games(game, cat, mouse, n_games, noise = _worker["noise"], stats = stats)
+    return cat_index, mouse_index, block_index, stats
+
+def tournament(cats, mice, games_per_pair = GAMES_PER_PAIR, processes = NUM_PROCESSES, seed = SEED, noise = NOISE, verbose = True):
+    """
+    Juega games_per_pair partidas de cada gato contra cada ratón, repartidas entre varios procesos.
+    Retorna una matriz (gatos x ratones) con las estadísticas (EpisodeStats) de cada enfrentamiento
+    """
+
+    blocks = [(index, min(BLOCK_SIZE, games_per_pair - start)) for index, start in enumerate(range(0, games_per_pair, BLOCK_SIZE))]
+    tasks = [(cat_index, mouse_index, cat_spec, mouse_spec, block_index, n_games, seed)
+             for cat_index, cat_spec in enumerate(cats) for mouse_index, mouse_spec in enumerate(mice) for block_index, n_games in blocks]
+    processes = processes or os.cpu_count()
+
+    # Los bloques de un enfrentamiento se combinan en orden, así el resultado no depende del número de procesos
+    results = {}
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes, initializer = init_worker, initargs = (noise,)) as pool:
+        for n_done, (cat_index, mouse_index, block_index, stats) in enumerate(pool.imap_unordered(play_pairing_block, tasks), start = 1):
+            results[cat_index, mouse_index, block_index] = stats
+            if verbose and n_done % max(len(tasks) // 20, 1) == 0:
+                print(f"Blocks: {n_done}/{len(tasks)} | Time: {time.perf_counter() - start:.1f} s")
+
+    matrix = [[EpisodeStats() for _ in mice] for _ in cats]
+    for (cat_index, mouse_index, block_index) in sorted(results):
+        matrix[cat_index][mouse_index].merge(results[cat_index, mouse_index, block_index])
+    return matrix
+
+def confidence_interval(stats, z = CONFIDENCE_Z):
+    """ Medio ancho del intervalo de confianza de la media de pasos """
+    return z * stats.std / np.sqrt(stats.count) if stats.count > 1 else float("nan")
+
+def rankings(cats, mice, matrix):
+    """
+    Media de pasos de cada participante sobre todos sus rivales, de mejor a peor:
+    el gato busca capturar rápido (menos pasos) y el ratón sobrevivir (más pasos)
+    """
+
+    cat_means = [np.mean([stats.mean for stats in row]) for row in matrix]
+    mouse_means = [np.mean([row[mouse_index].mean for row in matrix]) for mouse_index in range(len(mice))]
+    cat_ranking = sorted(zip(map(label, cats), cat_means), key = lambda entry: entry[1])
+    mouse_ranking = sorted(zip(map(label, mice), mouse_means), key = lambda entry: -entry[1])
+    return cat_ranking, mouse_ranking
+
+def print_matrix(cats, mice, matrix):
+    """ Matriz de media ± intervalo de confianza, un gato por fila y un ratón por columna """
+
+    width = max(14, *(len(label(spec)) for spec in mice))
+    first = max(len(label(spec)) for spec in cats)
+    print(" " * first + "".join(f" {label(spec):>{width}}" for spec in mice))
+    for spec, row in zip(cats, matrix):
+        cells = [f"{stats.mean:.1f} ± {confidence_interval(stats):.1f}" for stats in row]
+        print(f"{label(spec):<{first}}" + "".join(f" {cell:>{width}}" for cell in cells))
+
+def save_results(cats, mice, matrix, path):
+    """ Guarda un enfrentamiento por fila en un CSV, con su media, intervalo de confianza y cuantiles """
+
+    with open(path, "w", newline = "") as file:
+        writer = None
+        for cat_spec, row in zip(cats, matrix):
+            for mouse_spec, stats in zip(mice, row):
+                record = {"cat": label(cat_spec), "mouse": label(mouse_spec), **stats.summary(), "ci": confidence_interval(stats)}
+                if writer is None:
+                    writer = csv.DictWriter(file, fieldnames = list(record))
+                    writer.writeheader()
+                writer.writerow(record)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Torneo de todos los gatos contra todos los ratones guardados en agents/data")
+    parser.add_argument("--games", type = int, default = GAMES_PER_PAIR, help = "partidas por enfrentamiento")
+    parser.add_argument("--processes", type = int, default = NUM_PROCESSES, help = "número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--seed", type = int, default = SEED, help = "semilla base de las partidas")
+    parser.add_argument("--filter", help = "solo los snapshots cuyo nombre contiene este texto (por ejemplo Test2)")
+    parser.add_argument("--no-base", action = "store_true", help = "sin los agentes base")
+    parser.add_argument("--no-nn", action = "store_true", help = "sin los agentes neuronales")
+    parser.add_argument("--output", help = "archivo CSV donde guardar los resultados (por defecto en tournaments/)")
+    arguments = parser.parse_args()
+
+    entrants = build_entrants(include_base = not arguments.no_base, include_nn = not arguments.no_nn)
+    if arguments.filter:
+        entrants = {role: [spec for spec in specs if not spec[0].startswith("rl_") or arguments.filter in spec[1]] for role, specs in entrants.items()}
+    cats, mice = entrants["cat"], entrants["mouse"]
+    print(f"Cats: {len(cats)} | Mice: {len(mice)} | Games per pairing: {arguments.games}")
+
+    start = time.perf_counter()
+    matrix = tournament(cats, mice, arguments.games, arguments.processes, arguments.seed)
+    print_matrix(cats, mice, matrix)
+
+    cat_ranking, mouse_ranking = rankings(cats, mice, matrix)
+    print("Best Cat:", cat_ranking[0][0], f"| Mean Steps: {cat_ranking[0][1]:.1f}")
+    print("Best Mouse:", mouse_ranking[0][0], f"| Mean Steps: {mouse_ranking[0][1]:.1f}")
+
+    os.makedirs(TOURNAMENTS_PATH, exist_ok = True)
+    output = arguments.output or os.path.join(TOURNAMENTS_PATH, f"{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    save_results(cats, mice, matrix, output)
+    print(f"Total Time: {time.perf_counter() - start:.1f} s | Results:", os.path.relpath(output, CURRENT_PATH))
@@ -1,13 +1,43 @@
 import numpy as np
+import time
+import os
 from chase_game import ChaseGame
+from recorder import EpisodeRecorder, RECORDINGS_PATH
+from profiling import PhaseTimer, start_cprofile, dump_cprofile
+from stats import EpisodeStats, StatsWriter
+from evaluation import play_games
+from convergence import make_monitor, reduce_exploration, CHECK_EVERY, EVAL_GAMES
 
-from agents.baseline import BaseCat, BaseMouse
-from agents.neural import NNCat, NNMouse
-from agents.reinforced import RLCat, RLMouse
+# Los agentes se crean por nombre, así solo se importa el módulo (y TensorFlow) del agente elegido
+from agents.registry import make_agent
+from agents.replay import make_replay_trainer
 
 # Si deseamos o no visualización en el juego
 VISUALIZATION = False
 
+# Si deseamos grabar las partidas (se guardan en recordings/train, ver recorder.EpisodeReplay para verlas)
+RECORD = False
+
+# Si deseamos medir el tiempo de cada fase del ciclo (se reporta junto a las métricas cada 100 partidas)
+PROFILE = False
+
+# Si deseamos guardar un perfil completo de cProfile en profiles/train.prof (ver profiling.dump_cprofile)
+CPROFILE = False
+
+# Si deseamos repasar transiciones pasadas con experience replay (solo los agentes de Q-Learning, ver agents/replay.py)
+# y si los lotes se muestrean según el error de cada transición o de forma uniforme. Desactivado por defecto: con el
+# gato aprendiendo contra base_mouse llega a la misma evaluación en algo menos de partidas, pero cada paso cuesta más
+REPLAY = False
+PRIORITIZED_REPLAY = True
+
+# Archivo en stats/ donde guardar las estadísticas de cada 100 partidas (terminado en .jsonl o .csv, None para no guardarlas)
+STATS_LOG = None
+
+# Si deseamos revisar cada CHECK_EVERY partidas si las Q-Tables convergieron (ver convergence.py para los umbrales).
+# Al converger, "stop" termina el entrenamiento y "exploit" deja la exploración en su mínimo, terminando al converger de nuevo
+CONVERGENCE = True
+CONVERGENCE_ACTION = "stop"
+
 # Número de partidas a jugar para entrenar
 NUM_EPISODES = 100000
 
@@ -15,14 +45,41 @@ NUM_EPISODES = 100000
 game = ChaseGame(visualization = VISUALIZATION)
 
 # Instanciamos los agentes
-# cat = BaseCat(game.cat_pos)
-# mouse = BaseMouse(game.mouse_pos)
+# cat = make_agent("base_cat", game.cat_pos)
+# mouse = make_agent("base_mouse", game.mouse_pos)
+
+cat = make_agent("nn_cat", game.cat_pos, table = "NNCat.h5")         # Reemplazar con el nombre del archivo de la red neuronal (los agentes neuronales no aprenden en este archivo)
+mouse = make_agent("nn_mouse", game.mouse_pos, table = "NNMouse.h5") # Reemplazar con el nombre del archivo de la red neuronal (los agentes neuronales no aprenden en este archivo)
+
+# cat = make_agent("rl_cat", game.cat_pos)
+# mouse = make_agent("rl_mouse", game.mouse_pos)
 
-cat = NNCat(game.cat_pos, "NNCat.h5")         # Reemplazar con el nombre del archivo de la red neuronal (los agentes neuronales no aprenden en este archivo)
-mouse = NNMouse(game.mouse_pos, "NNMouse.h5") # Reemplazar con el nombre del archivo de la red neuronal (los agentes neuronales no aprenden en este archivo)
+# Buffers de experience replay (None para los agentes que no aprenden de una Q-Table)
+cat_replay = make_replay_trainer(cat, prioritized = PRIORITIZED_REPLAY) if REPLAY else None
+mouse_replay = make_replay_trainer(mouse, prioritized = PRIORITIZED_REPLAY) if REPLAY else None
 
-# cat = RLCat(game.cat_pos)
-# mouse = RLMouse(game.mouse_pos)
+# Monitores de convergencia de los agentes de Q-Learning (el gato busca menos pasos y el ratón más),
+# y un juego aparte para sus evaluaciones greedy
+monitors = [monitor for monitor in (make_monitor(cat, "Cat", higher_is_better = False), make_monitor(mouse, "Mouse", higher_is_better = True)) if monitor is not None] if CONVERGENCE else []
+eval_game = ChaseGame(visualization = False) if monitors else None
+
+# Grabación de las partidas
+recorder = EpisodeRecorder(os.path.join(RECORDINGS_PATH, "train"), game.lab_map) if RECORD else None
+
+# Tiempos de cada fase del ciclo (sin PROFILE no se mide nada)
+timer = PhaseTimer(enabled = PROFILE)
+profile = start_cprofile() if CPROFILE else None
+
+# Estadísticas de la duración de las partidas (media, varianza, cuantiles y capturas) de cada periodo y del total
+period_stats = EpisodeStats()
+total_stats = EpisodeStats()
+stats_writer = StatsWriter(STATS_LOG) if STATS_LOG is not None else None
+
+# Tiempo total del entrenamiento y de las revisiones de convergencia (evaluaciones y señales)
+train_start = time.perf_counter()
+eval_time = 0
+check_time = 0
+stopped_early = False
 
 # Métricas de desempeño
 mean_time = 0
@@ -42,11 +99,20 @@ for n_game in range(1, NUM_EPISODES + 1):
         old_mouse_pos = game.mouse_pos.copy()
 
         # Obtenemos la acción de cada agente
+        start = timer.tic()
         cat_action = cat.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = 0.1, train = True)
+        start = timer.toc("get_action/cat", start)
         mouse_action = mouse.get_action(game.lab_map, game.cat_pos, game.mouse_pos, noise = 0.05, train = True)
+        timer.toc("get_action/mouse", start)
         
+        # Guardamos el estado y las acciones de este paso
+        if recorder is not None:
+            recorder.record_step(game.cat_pos, game.mouse_pos, cat_action, mouse_action)
+
         # Jugamos el movimiento de cada agente
+        start = timer.tic()
         game.game_step(cat_action, mouse_action)
+        start = timer.toc("game_step", start)
 
         # Actualizamos las posiciones de cada agente
         cat.pos = game.cat_pos
@@ -54,23 +120,47 @@ for n_game in range(1, NUM_EPISODES + 1):
 
         # (Exclusivo para Q-Learning), se actualiza la política de comportamiento
         # (el método para los otros agentes es vacío)
-        cat.update_policy(game.lab_map, cat_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
-        mouse.update_policy(game.lab_map, mouse_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
+        start = timer.tic()
+        cat_reward = cat.update_policy(game.lab_map, cat_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
+        start = timer.toc("update_policy/cat", start)
+        mouse_reward = mouse.update_policy(game.lab_map, mouse_action, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos)
+        start = timer.toc("update_policy/mouse", start)
+
+        # Guardamos la transición (con la recompensa de update_policy) y cada cierto número de pasos se repasa un lote del buffer
+        if cat_replay is not None or mouse_replay is not None:
+            if cat_replay is not None:
+                cat_replay.observe(cat_action, cat_reward, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos, game.end)
+            if mouse_replay is not None:
+                mouse_replay.observe(mouse_action, mouse_reward, old_cat_pos, game.cat_pos, old_mouse_pos, game.mouse_pos, game.end)
+            timer.toc("replay", start)
 
     # (Exclusivo para Q-Learning), se actualiza la tasa de exploración
     # Aquí también aprovecharemos de guardar la Q-Table del agente
+    start = timer.tic()
     cat.update_exploration(n_game)
     mouse.update_exploration(n_game)
+    timer.toc("update_exploration", start)
+
+    # Cerramos la grabación de la partida
+    if recorder is not None:
+        recorder.end_episode()
 
     # Cada 100 partidas, reportamos el desempeño
     if n_game % 100 == 0:
         print('Game', n_game, '| Mean Steps:', period_steps//100, '| MAX:', max_time, "| MIN:", min_time, "| Total Steps:", period_steps)
+        if PROFILE:
+            print(timer.summary())
+        if stats_writer is not None:
+            stats_writer.write({"game": n_game, **period_stats.summary()})
+        total_stats.merge(period_stats)
+        period_stats.reset()
         period_steps = 0
         max_time = 0
         min_time = np.inf
 
-    # Métricas específicas de cada periodo
+    # Métricas específicas de cada periodo (el gato captura al ratón si terminan en la misma casilla)
     period_steps += game.t
+    period_stats.add(game.t, captured = bool((game.cat_pos == game.mouse_pos).all()))
     if game.t > max_time:
         max_time = game.t
     if game.t < min_time:
@@ -80,5 +170,59 @@ for n_game in range(1, NUM_EPISODES + 1):
     mean_time += 1 / n_game * (game.t - mean_time)
     total_time += game.t
 
+    # Cada CHECK_EVERY partidas, revisamos si las Q-Tables convergieron con una evaluación greedy (sin exploración)
+    if monitors and n_game % CHECK_EVERY == 0:
+        start = time.perf_counter()
+        eval_steps = play_games(eval_game, cat, mouse, EVAL_GAMES).mean()
+        check_start = time.perf_counter()
+        eval_time += check_start - start
+
+        print('Game', n_game, '| Greedy Eval Mean Steps:', round(eval_steps, 1))
+        for monitor in monitors:
+            print(monitor.line(monitor.check(eval_steps)))
+
+            # Si en esta partida se guardó un snapshot, su puntaje (mayor es mejor) lo protege de la retención si es el mejor
+            agent = monitor.agent
+            if agent.save_every is not None and n_game % agent.save_every == 0:
+                agent.checkpoints.record_score(n_game, eval_steps if monitor.higher_is_better else -eval_steps)
+
+            # Con "exploit", la primera vez que converge se reduce la exploración y se vuelve a esperar la convergencia
+            if monitor.converged and CONVERGENCE_ACTION == "exploit" and agent.max_exploration_rate > agent.min_exploration_rate:
+                reduce_exploration(agent)
+                monitor.reset()
+                print(f"{monitor.name} | Convergió, exploración reducida a {agent.min_exploration_rate}")
+        check_time += time.perf_counter() - check_start
+
+        if all(monitor.converged for monitor in monitors):
+            stopped_early = n_game < NUM_EPISODES
+            break
+
     # Si la partida termina, iniciamos una nueva
     game.reset()
+
+# Si el entrenamiento terminó antes, guardamos también las Q-Tables finales
+if stopped_early:
+    print('Game', n_game, '| Convergencia alcanzada, entrenamiento detenido')
+    for monitor in monitors:
+        agent = monitor.agent
+        if agent.save_every is not None and n_game % agent.save_every != 0:
+            agent.checkpoints.save(n_game, agent.q_table)
+
+# Dónde se fue el tiempo: entrenamiento, evaluaciones greedy y cálculo de las señales de convergencia
+total_train_time = time.perf_counter() - train_start
+print(f"Games: {n_game}/{NUM_EPISODES} | Time: {total_train_time:.1f} s | Training: {total_train_time - eval_time - check_time:.1f} s | "
+      f"Greedy Evals: {eval_time:.1f} s | Convergence Checks: {check_time:.1f} s")
+
+# Estadísticas de todas las partidas
+total_stats.merge(period_stats)
+print("Total |", total_stats.line())
+if stats_writer is not None:
+    stats_writer.close()
+
+# Escribimos en disco lo que quede pendiente de la grabación
+if recorder is not None:
+    recorder.close()
+
+# Guardamos el perfil de cProfile
+if profile is not None:
+    print("Perfil guardado en", dump_cprofile(profile, "train.prof"))
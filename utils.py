@@ -1,4 +1,6 @@
+from collections import OrderedDict
 import numpy as np
+import os
 
 class Cell:
     """ Clase que define a un nodo, usado en BFS """
@@ -74,26 +76,327 @@ def bfs_search(grid_map, cat_pos, mouse_pos):
 def get_valid_moves(lab_map, agent_pos):
     """ Movimientos posibles en el mapa para un agente en posición agent_pos """
 
-    moves_dict = {
-        0: np.array([0, -1]),
-        1: np.array([0, 1]),
-        2: np.array([-1, 0]),
-        3: np.array([1, 0]),
-        4: np.array([0, 0])
-    }
+    # La máscara de la casilla indica qué movimientos no llevan fuera del mapa ni a una pared (ver LegalMoves)
+    legal_moves = get_legal_moves(lab_map)
+    return list(MOVES_BY_MASK[legal_moves.masks[agent_pos[0], agent_pos[1]]])
 
-    moves = []
+# Efecto de cada movimiento sobre la posición de un agente (mismo orden que en ChaseGame)
+MOVES = np.array([
+    [0, -1],
+    [0, 1],
+    [-1, 0],
+    [1, 0],
+    [0, 0]
+])
 
-    # Probamos cada movimiento y vemos si el punto a donde nos lleva está obstruido
-    for move in moves_dict.keys():
+# Movimientos de cada máscara de movimientos legales (el bit k indica si el movimiento k es legal), ver LegalMoves
+MOVES_BY_MASK = tuple(tuple(move for move in range(len(MOVES)) if mask >> move & 1) for mask in range(1 << len(MOVES)))
 
-        new_agent_pos = agent_pos + moves_dict[move]
+# Orden en que bfs_search expande los vecinos (izquierda, derecha, abajo, arriba en coordenadas x, y)
+BFS_MOVE_ORDER = (2, 3, 0, 1)
 
-        if np.min(new_agent_pos) < 0 or np.max(new_agent_pos) >= lab_map.shape[0]:
-            continue
-        elif lab_map[new_agent_pos[0], new_agent_pos[1]] == 1:
-            continue
+# Oráculos ya construidos, uno por cada mapa distinto (y por cada array de mapa, para no comparar su contenido
+# en cada llamada, lo que en mapas grandes significa copiar megabytes por paso), de los menos a los más
+# recientemente usados
+_ORACLE_CACHE = OrderedDict()
+_ORACLE_BY_ARRAY = OrderedDict()
+
+# Tablas de movimientos legales ya construidas, por mapa y por array de mapa (igual que los oráculos)
+_LEGAL_CACHE = OrderedDict()
+_LEGAL_BY_ARRAY = OrderedDict()
+
+# Mapas (y arrays de mapa) que conserva cada uno de esos cachés: quien genera mapas nuevos una y otra vez
+# (benchmarks.py, map_generator.py) no acumula sus arrays ni sus tablas de distancias
+MAP_CACHE_SIZE = 8
+
+# Sobre este número de casillas libres, las distancias se calculan por filas a medida que se piden
+# (la tabla completa crece con el cuadrado de las casillas, 2500 casillas son ~12 MB por tabla)
+DENSE_ORACLE_MAX_CELLS = 2500
+
+# Filas de distancias que guarda en memoria el oráculo por filas (cada una ocupa 4 bytes por casilla libre)
+LAZY_ORACLE_ROWS = 256
+
+class StateEncoder:
+    """ Traduce posiciones del gato y el ratón al índice de su fila en una Q-Table """
+
+    def __init__(self, lab_map):
+        # Índice de cada casilla libre, en el mismo orden en que se recorre el mapa (-1 en las paredes)
+        free = lab_map == 0
+        self.free_positions = np.argwhere(free)
+        self.n_free = len(self.free_positions)
+        self.cell_index = np.full(lab_map.shape, -1, dtype=np.int32)
+        self.cell_index[free] = np.arange(self.n_free, dtype=np.int32)
+
+        # Número de estados posibles del juego (un par de casillas libres)
+        self.n_states = self.n_free ** 2
+
+    def cell_ids(self, positions):
+        """ Índice de la casilla de cada posición, acepta una posición o un array de ellas """
+        positions = np.asarray(positions)
+        return self.cell_index[positions[..., 0], positions[..., 1]]
+
+    def encode(self, cat_pos, mouse_pos):
+        """ Fila de la Q-Table asociada al estado (cat_pos, mouse_pos), acepta arrays de posiciones """
+        # En int64, con más de ~46000 casillas libres el índice no cabe en int32
+        return self.cell_ids(cat_pos).astype(np.int64) * self.n_free + self.cell_ids(mouse_pos)
+
+    def decode(self, rows):
+        """ Posiciones del gato y el ratón asociadas a una o varias filas de la Q-Table """
+        cat_ids, mouse_ids = np.divmod(rows, self.n_free)
+        return self.free_positions[cat_ids], self.free_positions[mouse_ids]
+
+class LegalMoves:
+    """
+    Movimientos legales precalculados para cada casilla del mapa: masks[x, y] es un uint8 cuyo bit k indica si el
+    movimiento k lleva a una casilla libre dentro del mapa, y destinations[x, y, k] es el índice (x * columnas + y)
+    de la casilla donde queda el agente tras el movimiento k (la misma casilla si no es legal)
+    """
+
+    def __init__(self, lab_map):
+        self.shape = lab_map.shape
+        rows, cols = lab_map.shape
+        x, y = np.indices(lab_map.shape)
+        own = (x * cols + y).astype(np.int32)
+
+        self.masks = np.zeros(lab_map.shape, dtype=np.uint8)
+        self.destinations = np.repeat(own[..., None], len(MOVES), axis=2)
+        for move, (dx, dy) in enumerate(MOVES):
+            new_x, new_y = x + dx, y + dy
+            inside = (new_x >= 0) & (new_x < rows) & (new_y >= 0) & (new_y < cols)
+            legal = inside.copy()
+            legal[inside] = lab_map[new_x[inside], new_y[inside]] == 0
+            self.masks[legal] |= np.uint8(1 << move)
+            self.destinations[legal, move] = new_x[legal] * cols + new_y[legal]
+
+    def is_legal(self, positions, moves):
+        """ Indica si cada movimiento es legal desde su posición, acepta una posición o un array de ellas """
+        positions = np.asarray(positions)
+        return (self.masks[positions[..., 0], positions[..., 1]] >> np.asarray(moves, dtype=np.uint8) & 1).astype(bool)
+
+    def move(self, positions, moves):
+        """ Posiciones tras cada movimiento (los movimientos ilegales dejan al agente en su lugar) """
+        positions = np.asarray(positions)
+        destinations = self.destinations[positions[..., 0], positions[..., 1], moves]
+        return np.stack(np.divmod(destinations, self.shape[1]), axis=-1)
+
+class DistanceOracle:
+    """ Tabla precalculada de distancias y siguiente movimiento entre todo par de casillas libres """
+
+    def __init__(self, lab_map):
+        self.lab_map = lab_map
+
+        # Índice de cada casilla libre dentro de las tablas
+        self.encoder = StateEncoder(lab_map)
+        self.cell_index = self.encoder.cell_index
+        self.free_positions = self.encoder.free_positions
+        n_free = self.encoder.n_free
+
+        # Vecino libre de cada casilla para cada movimiento (-1 si el movimiento no es posible)
+        neighbors = get_neighbor_table(self.encoder, lab_map)
+
+        # BFS desde todas las casillas a la vez, avanzando un nivel por iteración
+        dtype = np.int16 if n_free < np.iinfo(np.int16).max else np.int32
+        self.distances = np.full((n_free, n_free), -1, dtype=dtype)
+        frontier = np.eye(n_free, dtype=bool)
+        reached = frontier.copy()
+        level = 0
+        while frontier.any():
+            self.distances[frontier] = level
+            expanded = np.zeros_like(frontier)
+            for move in BFS_MOVE_ORDER:
+                valid = neighbors[:, move] >= 0
+                expanded[:, valid] |= frontier[:, neighbors[valid, move]]
+            frontier = expanded & ~reached
+            reached |= frontier
+            level += 1
+
+        # Siguiente movimiento en la ruta más corta, con el mismo desempate que bfs_search:
+        # el primer vecino (en orden de expansión) que esté un paso más cerca del objetivo
+        self.next_moves = np.full((n_free, n_free), 4, dtype=np.uint8)
+        pending = self.distances > 0
+        for move in BFS_MOVE_ORDER:
+            valid = neighbors[:, move] >= 0
+            closer = np.zeros_like(pending)
+            closer[valid] = self.distances[neighbors[valid, move]] == self.distances[valid] - 1
+            chosen = pending & closer
+            self.next_moves[chosen] = move
+            pending &= ~chosen
+
+    def distance(self, a, b):
+        """ Número de pasos de la ruta más corta entre a y b (-1 si no existe), acepta arrays de posiciones """
+        return self.distances[self.encoder.cell_ids(a), self.encoder.cell_ids(b)]
+
+    def next_move(self, a, b):
+        """ Primer movimiento de la ruta más corta de a hacia b (4 si ya están juntos o no hay ruta) """
+        return self.next_moves[self.encoder.cell_ids(a), self.encoder.cell_ids(b)]
+
+class LazyDistanceOracle:
+    """
+    Misma interfaz que DistanceOracle (distance y next_move) para mapas grandes: en vez de la tabla completa,
+    calcula con BFS las distancias de todas las casillas hacia cada objetivo la primera vez que se pide,
+    y guarda en memoria solo las últimas max_rows. No tiene los atributos distances ni next_moves
+    """
+
+    def __init__(self, lab_map, max_rows = LAZY_ORACLE_ROWS):
+        self.lab_map = lab_map
+        self.max_rows = max_rows
+
+        self.encoder = StateEncoder(lab_map)
+        self.cell_index = self.encoder.cell_index
+        self.free_positions = self.encoder.free_positions
+        self.neighbors = get_neighbor_table(self.encoder, lab_map)
+
+        # Distancias hacia cada objetivo ya calculadas, de la menos a la más recientemente usada
+        self.rows = OrderedDict()
+
+    def row(self, target):
+        """ Distancia de cada casilla libre hacia la casilla target (-1 si no hay ruta) """
+
+        if target in self.rows:
+            self.rows.move_to_end(target)
+            return self.rows[target]
+
+        # BFS desde el objetivo (el mapa no tiene direcciones, así que ida y vuelta miden lo mismo)
+        row = np.full(self.encoder.n_free, -1, dtype=np.int32)
+        frontier = np.array([target])
+        level = 0
+        while len(frontier) > 0:
+            row[frontier] = level
+            expanded = self.neighbors[frontier, :4].ravel()
+            expanded = expanded[expanded >= 0]
+            frontier = np.unique(expanded[row[expanded] < 0])
+            level += 1
+
+        self.rows[target] = row
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last = False)
+        return row
+
+    def lookup(self, a, b, function):
+        # Agrupamos las consultas por objetivo, así cada fila se busca una vez por llamada
+        a_ids, b_ids = self.encoder.cell_ids(a), self.encoder.cell_ids(b)
+        if np.ndim(b_ids) == 0:
+            return function(self.row(int(b_ids)), a_ids)
+
+        a_ids, b_ids = np.broadcast_arrays(a_ids, b_ids)
+        result = None
+        for target in np.unique(b_ids):
+            mask = b_ids == target
+            values = function(self.row(int(target)), a_ids[mask])
+            if result is None:
+                result = np.empty(b_ids.shape, dtype=values.dtype)
+            result[mask] = values
+        return result
+
+    def distance(self, a, b):
+        """ Número de pasos de la ruta más corta entre a y b (-1 si no existe), acepta arrays de posiciones """
+        return self.lookup(a, b, lambda row, a_ids: row[a_ids])
+
+    def next_move(self, a, b):
+        """ Primer movimiento de la ruta más corta de a hacia b (4 si ya están juntos o no hay ruta) """
+        return self.lookup(a, b, self.closer_moves)
+
+    def closer_moves(self, row, a_ids):
+        # Mismo desempate que DistanceOracle: el primer vecino (en orden de bfs_search) un paso más cerca del objetivo
+        moves = np.full(np.shape(a_ids), 4, dtype=np.uint8)
+        pending = row[a_ids] > 0
+        for move in BFS_MOVE_ORDER:
+            neighbor = self.neighbors[a_ids, move]
+            chosen = pending & (neighbor >= 0) & (row[neighbor] == row[a_ids] - 1)
+            moves[chosen] = move
+            pending &= ~chosen
+        return moves
+
+def get_neighbor_table(encoder, lab_map):
+    """ Índice de la casilla libre a la que lleva cada movimiento desde cada casilla libre (-1 si no es posible) """
+
+    neighbors = np.full((encoder.n_free, len(MOVES)), -1, dtype=np.int32)
+    for move, delta in enumerate(MOVES):
+        new_pos = encoder.free_positions + delta
+        inside = np.all((new_pos >= 0) & (new_pos < lab_map.shape), axis=1)
+        neighbors[inside, move] = encoder.cell_index[new_pos[inside, 0], new_pos[inside, 1]]
+    return neighbors
+
+def remember(cache, key, value, max_size = MAP_CACHE_SIZE):
+    """ Guarda value en un caché LRU (un OrderedDict), descartando el menos recientemente usado si se llena """
+
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > max_size:
+        cache.popitem(last = False)
+    return value
+
+def get_distance_oracle(lab_map):
+    """
+    Retorna el oráculo de distancias del mapa, construyéndolo solo la primera vez que se pide
+    (en mapas con más de DENSE_ORACLE_MAX_CELLS casillas libres, uno que calcula las distancias por filas)
+    """
+
+    # Los mapas no se modifican durante el juego, así que el mismo array siempre tiene el mismo oráculo
+    cached = _ORACLE_BY_ARRAY.get(id(lab_map))
+    if cached is not None and cached[0] is lab_map:
+        _ORACLE_BY_ARRAY.move_to_end(id(lab_map))
+        return cached[1]
+
+    key = (lab_map.shape, lab_map.tobytes())
+    oracle = _ORACLE_CACHE.get(key)
+    if oracle is None:
+        if np.count_nonzero(lab_map == 0) > DENSE_ORACLE_MAX_CELLS:
+            oracle = LazyDistanceOracle(lab_map)
         else:
-            moves.append(move)
+            oracle = DistanceOracle(lab_map)
+    remember(_ORACLE_CACHE, key, oracle)
+    remember(_ORACLE_BY_ARRAY, id(lab_map), (lab_map, oracle))
+    return oracle
+
+def get_legal_moves(lab_map):
+    """ Retorna la tabla de movimientos legales del mapa, construyéndola solo la primera vez que se pide """
+
+    # Igual que en get_distance_oracle, el mismo array de mapa siempre tiene la misma tabla
+    cached = _LEGAL_BY_ARRAY.get(id(lab_map))
+    if cached is not None and cached[0] is lab_map:
+        _LEGAL_BY_ARRAY.move_to_end(id(lab_map))
+        return cached[1]
+
+    key = (lab_map.shape, lab_map.tobytes())
+    legal_moves = _LEGAL_CACHE.get(key)
+    if legal_moves is None:
+        legal_moves = LegalMoves(lab_map)
+    remember(_LEGAL_CACHE, key, legal_moves)
+    remember(_LEGAL_BY_ARRAY, id(lab_map), (lab_map, legal_moves))
+    return legal_moves
+
+# Contextos de mapa ya cargados, uno por cada archivo de mapa
+_CONTEXT_CACHE = {}
+
+class MapContext:
+    """ Mapa de juego cargado junto con sus posiciones libres, índices y tabla de movimientos """
+
+    def __init__(self, lab_map):
+        self.lab_map = lab_map
+
+        # Posiciones libres y el índice de cada una (compartidos con la Q-Table)
+        self.encoder = StateEncoder(lab_map)
+        self.free_positions = self.encoder.free_positions
+        self.cell_index = self.encoder.cell_index
+
+        # Casilla de destino de cada movimiento desde cada casilla libre (si el movimiento es inválido, se queda en su lugar)
+        neighbors = get_neighbor_table(self.encoder, lab_map)
+        own_ids = np.arange(self.encoder.n_free, dtype=np.int32)[:, None]
+        self.move_table = np.where(neighbors >= 0, neighbors, own_ids).astype(np.int32)
+
+        # Movimientos legales desde cada casilla del mapa (también desde las paredes)
+        self.legal_moves = get_legal_moves(lab_map)
+
+    @property
+    def oracle(self):
+        """ Oráculo de distancias del mapa (se construye la primera vez que se pide) """
+        return get_distance_oracle(self.lab_map)
+
+def get_map_context(map_path):
+    """ Retorna el contexto del mapa guardado en map_path, leyendo el archivo solo la primera vez """
 
-    return moves
\ No newline at end of file
+    key = os.path.realpath(map_path)
+    if key not in _CONTEXT_CACHE:
+        _CONTEXT_CACHE[key] = MapContext(np.load(key))
+    return _CONTEXT_CACHE[key]